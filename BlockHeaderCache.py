@@ -0,0 +1,54 @@
+import sqlite3, threading
+from DfiBlockSource import as_block_hash
+
+class BlockHeaderCache:
+
+    # confirmed block headers never change, so once a block has been fetched it can be served from disk forever
+    def __init__(self, db_path):
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        with self.__lock, self.__db:
+            # hash is UNIQUE so sqlite keeps an index on it as well as on the height primary key
+            self.__db.execute("CREATE TABLE IF NOT EXISTS block_headers ("
+                              "height INTEGER PRIMARY KEY, hash TEXT NOT NULL UNIQUE, timestamp TEXT NOT NULL, "
+                              "minter TEXT NOT NULL, prev_block TEXT, next_block TEXT)")
+
+    def get(self, block):
+        # block can be given as a height or a hash, same as on https://defiscan.live/
+        if (str(block).isdigit()):
+            query = "SELECT height, hash, timestamp, minter, prev_block, next_block FROM block_headers WHERE height = ?"
+            key = int(block)
+        else:
+            query = "SELECT height, hash, timestamp, minter, prev_block, next_block FROM block_headers WHERE hash = ?"
+            key = str(block)
+        with self.__lock:
+            row = self.__db.execute(query, (key,)).fetchone()
+        return None if row is None else self.to_header_row(row)
+
+    def get_range(self, first_height, last_height):
+        # every cached header between the two heights (inclusive), one primary key range scan
+        with self.__lock:
+            rows = self.__db.execute("SELECT height, hash, timestamp, minter, prev_block, next_block FROM block_headers "
+                                     "WHERE height BETWEEN ? AND ? ORDER BY height", (int(first_height), int(last_height))).fetchall()
+        return [self.to_header_row(row) for row in rows]
+
+    def to_header_row(self, row):
+        # caches written before prev_block was always a hash can still hold a height there
+        return row[:4] + (as_block_hash(row[4]),) + row[5:]
+
+    def put_many(self, headers):
+        # one transaction for a whole batch of (height, hash, timestamp, minter, prev_block, next_block) rows
+        with self.__lock, self.__db:
+            self.__db.executemany("INSERT OR REPLACE INTO block_headers (height, hash, timestamp, minter, prev_block, next_block) "
+                                  "VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(int(header[0]),) + tuple(header[1:]) for header in headers])
+
+    def put(self, height, block_hash, timestamp, minter, prev_block, next_block):
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO block_headers (height, hash, timestamp, minter, prev_block, next_block) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (int(height), block_hash, timestamp, minter, prev_block, next_block))
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
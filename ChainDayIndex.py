@@ -0,0 +1,36 @@
+import sqlite3, threading
+
+class ChainDayIndex:
+
+    # date -> height of the first block of that date (UTC), one small row per day and a primary key read per lookup
+    def __init__(self, db_path):
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute("CREATE TABLE IF NOT EXISTS first_blocks ("
+                              "date TEXT PRIMARY KEY, height INTEGER NOT NULL) WITHOUT ROWID")
+
+    def get(self, date):
+        # date is an ISO date string, ex: 2022-02-05
+        with self.__lock:
+            row = self.__db.execute("SELECT height FROM first_blocks WHERE date = ?", (date,)).fetchone()
+        if (row is None):
+            return None
+        return row[0]
+
+    def last(self):
+        # the latest indexed (date, height), where the next index-days run picks up
+        with self.__lock:
+            return self.__db.execute("SELECT date, height FROM first_blocks ORDER BY date DESC LIMIT 1").fetchone()
+
+    def put(self, date, height):
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO first_blocks (date, height) VALUES (?, ?)", (date, int(height)))
+
+    def count(self):
+        with self.__lock:
+            return self.__db.execute("SELECT COUNT(*) FROM first_blocks").fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
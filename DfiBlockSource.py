@@ -0,0 +1,252 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# the fields the lottery needs from a DFI block, in the same order as the block header cache columns
+#   height     = block height (int)
+#   hash       = block hash
+#   timestamp  = block time in the format https://defiscan.live/ shows it, ex: "Feb 5, 2022, 12:00:02 AM" (UTC)
+#   minter     = address of the masternode operator that minted the block
+#   prev_block = hash of the previous block (64 hex digits) from every source, None when the source does not give one
+#   next_block = height of the next block, None while the block is the tip of the chain
+BlockHeader = namedtuple("BlockHeader", ["height", "hash", "timestamp", "minter", "prev_block", "next_block"])
+
+BLOCK_SOURCES = ["defiscan", "rpc", "fake"]
+DEFAULT_BLOCK_SOURCE = "defiscan"
+DEFISCAN_BLOCK_URL = "https://defiscan.live/blocks/"
+DEFAULT_RPC_URL = "http://127.0.0.1:8554/"
+# how format_block_time renders a block time, strptime accepts its unpadded day and hour
+BLOCK_TIME_FORMAT = "%b %d, %Y, %I:%M:%S %p"
+# JSON-RPC error codes defid answers with for a height past the tip or an unknown hash
+RPC_BLOCK_NOT_FOUND_CODES = (-8, -5)
+
+class BlockNotFound(ValueError):
+
+    # the source has no such block: a height past the tip of the chain or an unknown hash.  Everything else that can go
+    # wrong (connection errors, HTTP 5xx, RPC auth, replay misses) stays a plain ValueError, so callers that treat a
+    # missing block as the end of the chain do not mistake an outage for it
+    pass
+
+def create_block_source(args, session=None):
+    block_source = getattr(args, "block_source", None) or DEFAULT_BLOCK_SOURCE
+    if (block_source == "rpc"):
+        return DefichainRpcBlockSource(getattr(args, "rpc_url", None) or DEFAULT_RPC_URL,
+                                       getattr(args, "rpc_user", None), getattr(args, "rpc_password", None), session)
+    if (block_source == "fake"):
+        if (not getattr(args, "fake_chain", None)):
+            raise ValueError("block source 'fake' needs a -fake_chain file")
+        return FakeBlockSource.from_file(args.fake_chain)
+    return DefiscanBlockSource(session=session)
+
+def as_block_hash(value):
+    # prev_block is always a block hash, a link that carries anything else (a height) is dropped instead of mixed in
+    if (value is not None and len(str(value)) == 64):
+        try:
+            bytes.fromhex(str(value))
+            return str(value)
+        except ValueError:
+            pass
+    return None
+
+def format_block_time(unix_time):
+    # same rendering as https://defiscan.live/ so every source prints and caches identical timestamps
+    dt = datetime.fromtimestamp(int(unix_time), tz=timezone.utc)
+    return "{} {}, {}, {}:{} {}".format(dt.strftime("%b"), dt.day, dt.year, dt.hour % 12 or 12, dt.strftime("%M:%S"), dt.strftime("%p"))
+
+def parse_block_time(timestamp):
+    # back to unix seconds, dateutil is only needed for block times in some other shape
+    try:
+        dt = datetime.strptime(timestamp, BLOCK_TIME_FORMAT)
+    except ValueError:
+        from dateutil.parser import parse
+        dt = parse(timestamp)
+    if (dt.tzinfo is None):
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+class DefiscanBlockSource:
+
+    # scrapes the rendered block page, kept as the fallback when no node is available
+    def __init__(self, url=DEFISCAN_BLOCK_URL, session=None):
+        self.url = url
+        if (session is None):
+            from DfiHttpSession import DfiHttpSession
+            session = DfiHttpSession()
+        self.session = session
+
+    def get_block(self, block):
+        # the target we want to open
+        url=self.url+str(block)
+
+        #open with GET method, the session retries with backoff on connection errors and 429/5xx
+        resp=self.session.get(url)
+
+        #http_respone 200 means OK status, 404 is a block defiscan does not know (yet)
+        if resp.status_code==404:
+            raise BlockNotFound("ERROR: block " + str(block) + " not found at URL: " + url)
+        if resp.status_code!=200:
+            raise ValueError("ERROR fetching DFI block info from URL: " + url + " (HTTP " + str(resp.status_code) + ")")
+        return self.parse_block_page(block, resp.text)
+
+    def parse_block_page(self, block, html):
+        # we need a parser, Python built-in HTML parser is enough .
+        from bs4 import BeautifulSoup
+        soup=BeautifulSoup(html,'html.parser')
+
+        # block_hash_search is the list which contains all the text in the tag we are searching for
+        block_hash_search=soup.find("div",{"class":"ml-1 text-lg break-all"})
+        block_hash = self.parse_value_from_div(block_hash_search)
+
+        timestamp_field_search=soup.findAll("div",{"class":"table-cell px-4 md:px-6 py-3 text-gray-600 align-middle"})
+        timestamp = self.parse_value_from_div(timestamp_field_search[2])
+        prev_block = as_block_hash(self.parse_value_from_div_with_url2(timestamp_field_search[len(timestamp_field_search)-2]))
+        try:
+            next_block = self.parse_value_from_div_with_url2(timestamp_field_search[len(timestamp_field_search)-1])
+        except IndexError:
+            # the tip of the chain has no link to a next block yet
+            next_block = None
+
+        minter_search=soup.find("div",{"class":"hover:underline text-blue-500 cursor-pointer break-all"})
+        minter = self.parse_value_from_div_with_url(minter_search)
+
+        if (str(block).isdigit()):
+            height = int(block)
+        elif (next_block is not None and next_block.isdigit()):
+            # block was given as a hash, the link to the next block carries the height
+            height = int(next_block) - 1
+        else:
+            height = None
+        return BlockHeader(height, block_hash, timestamp, minter, prev_block, next_block)
+
+    def parse_value_from_div(self, html):
+        splitter1 = str(html).split(">")
+        #print(splitter1)
+        splitter2 = splitter1[1].split("<")
+        #print(splitter2)
+        value = splitter2[0]
+        return value
+
+    def parse_value_from_div_with_url(self, html):
+        splitter1 = str(html).split(">")
+        #print(splitter1)
+        splitter2 = splitter1[2].split("<")
+        #print(splitter2)
+        value = splitter2[0]
+        return value
+
+    def parse_value_from_div_with_url2(self, html):
+        splitter1 = str(html).split(">")
+        #print(splitter1)
+        splitter2 = splitter1[3].split("<")
+        #print(splitter2)
+        splitter3 = splitter2[0].split("#")
+        #print(splitter3)
+        value = splitter3[1]
+        return value
+
+class DefichainRpcBlockSource:
+
+    # talks JSON-RPC to a DeFiChain node (defid), fields come back structured so nothing has to be scraped
+    def __init__(self, url=DEFAULT_RPC_URL, user=None, password=None, session=None):
+        self.url = url
+        self.auth = (user, password) if user is not None else None
+        if (session is None):
+            from DfiHttpSession import DfiHttpSession
+            session = DfiHttpSession()
+        self.session = session
+
+    def get_block(self, block):
+        if (str(block).isdigit()):
+            block_hash = self.call("getblockhash", [int(block)])
+        else:
+            block_hash = str(block)
+        return self.to_header(self.call("getblock", [block_hash, 1]))
+
+    def get_blocks(self, heights):
+        # a run of heights in two batched calls instead of two calls per block, cut short at the tip of the chain
+        hashes = []
+        for block_hash, error in self.call_batch("getblockhash", [[int(height)] for height in heights]):
+            if (self.is_block_not_found(error)):
+                break
+            if (error is not None):
+                raise ValueError("ERROR calling DeFiChain RPC getblockhash: " + str(error))
+            hashes.append(block_hash)
+        if (not hashes):
+            return []
+        headers = []
+        for block_info, error in self.call_batch("getblock", [[block_hash, 1] for block_hash in hashes]):
+            if (error is not None):
+                raise ValueError("ERROR calling DeFiChain RPC getblock: " + str(error))
+            headers.append(self.to_header(block_info))
+        return headers
+
+    def to_header(self, block_info):
+        if ("nextblockhash" in block_info):
+            next_block = str(block_info["height"] + 1)
+        else:
+            next_block = None
+        return BlockHeader(block_info["height"], block_info["hash"], format_block_time(block_info["time"]),
+                           block_info["minter"], as_block_hash(block_info.get("previousblockhash")), next_block)
+
+    def call(self, method, params):
+        payload = {"jsonrpc": "1.0", "id": "dfi_lotto_calc", "method": method, "params": params}
+        reply = self.post(method, payload)
+        if (self.is_block_not_found(reply.get("error"))):
+            raise BlockNotFound("ERROR calling DeFiChain RPC " + method + ": " + str(reply["error"]))
+        if (reply.get("error")):
+            raise ValueError("ERROR calling DeFiChain RPC " + method + ": " + str(reply["error"]))
+        return reply["result"]
+
+    def is_block_not_found(self, error):
+        return isinstance(error, dict) and error.get("code") in RPC_BLOCK_NOT_FOUND_CODES
+
+    def call_batch(self, method, params_list):
+        # one JSON-RPC batch request, (result, error) pairs come back in the order of params_list
+        payload = [{"jsonrpc": "1.0", "id": i, "method": method, "params": params} for i, params in enumerate(params_list)]
+        reply = self.post(method, payload)
+        if (not isinstance(reply, list)):
+            raise ValueError("ERROR calling DeFiChain RPC " + method + " as a batch: " + str(reply.get("error")))
+        replies = sorted(reply, key=lambda item: item["id"])
+        return [(item.get("result"), item.get("error")) for item in replies]
+
+    def post(self, method, payload):
+        resp = self.session.post(self.url, data=json.dumps(payload), auth=self.auth,
+                                 headers={"Content-Type": "application/json"})
+        try:
+            return resp.json()
+        except ValueError:
+            raise ValueError("ERROR calling DeFiChain RPC " + method + " at " + self.url + " (HTTP " + str(resp.status_code) + ")")
+
+class FakeBlockSource:
+
+    # serves block headers from memory, so the whole calc pipeline can run offline
+    def __init__(self, headers):
+        self.__by_height = {}
+        self.__by_hash = {}
+        for header in headers:
+            self.__by_height[header.height] = header
+            self.__by_hash[header.hash] = header
+
+    @classmethod
+    def from_file(cls, path):
+        # JSON list of objects with the BlockHeader fields, timestamp may be a unix time instead of the defiscan text
+        with open(path) as f:
+            blocks = json.load(f)
+        headers = []
+        for block in blocks:
+            timestamp = block["timestamp"]
+            if (isinstance(timestamp, (int, float))):
+                timestamp = format_block_time(timestamp)
+            next_block = block.get("next_block")
+            headers.append(BlockHeader(int(block["height"]), block["hash"], timestamp, block["minter"],
+                                       as_block_hash(block.get("prev_block")), None if next_block is None else str(next_block)))
+        return cls(headers)
+
+    def get_block(self, block):
+        if (str(block).isdigit()):
+            header = self.__by_height.get(int(block))
+        else:
+            header = self.__by_hash.get(str(block))
+        if (header is None):
+            raise BlockNotFound("ERROR: block " + str(block) + " is not in the fake chain")
+        return header
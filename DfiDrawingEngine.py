@@ -0,0 +1,68 @@
+import hashlib
+from typing import NamedTuple
+
+# The DFI Community Lottery drawing, with no I/O and no shared state, so it is safe to call from any thread:
+#   1. multiply_dfi_by_btc = round(DFI/USDT price * BTC/USDT price) at midnight of the target date
+#   2. first_concat        = multiply_dfi_by_btc + first block of the target date + last 4 of its hash + last 4 of its minter
+#   3. sha256_result       = SHA-256 of first_concat
+#   4. second_concat       = first 5 + last 5 hex digits of sha256_result
+#   5. decimal_result      = second_concat / 16^10
+#   6. winning_ticket      = round(decimal_result * total_number_of_tickets)
+
+SECOND_CONCAT_SCALE = pow(16, 10)
+
+class DrawingInputs(NamedTuple):
+    dfi_at_midnight: float
+    btc_at_midnight: float
+    first_block_of_target_date: int
+    block_hash: str
+    minter: str
+    total_number_of_tickets: int
+
+class DrawingResult(NamedTuple):
+    dfi_at_midnight: float
+    btc_at_midnight: float
+    multiply_dfi_by_btc: int
+    first_block_of_target_date: int
+    last_4_digits_of_block_hash: str
+    last_4_digits_of_block_minter: str
+    first_concat: str
+    sha256_result: str
+    second_concat: str
+    decimal_of_second_concat: int
+    decimal_result: float
+    total_number_of_tickets: int
+    winning_ticket: int
+
+def compute_winning_ticket(inputs):
+    if (int(inputs.total_number_of_tickets) <= 0):
+        raise ValueError("total_number_of_tickets must be positive, got " + str(inputs.total_number_of_tickets))
+    if (len(inputs.block_hash) < 4 or len(inputs.minter) < 4):
+        raise ValueError("block_hash and minter need at least 4 characters")
+
+    multiply_dfi_by_btc = multiply_prices(inputs.dfi_at_midnight, inputs.btc_at_midnight)
+    last_4_digits_of_block_hash = inputs.block_hash[-4:]
+    last_4_digits_of_block_minter = inputs.minter[-4:]
+    first_concat = build_first_concat(multiply_dfi_by_btc, inputs.first_block_of_target_date, inputs.block_hash, inputs.minter)
+    sha256_result = hashlib.sha256(first_concat.encode('utf-8')).hexdigest()
+    second_concat = build_second_concat(sha256_result)
+    decimal_of_second_concat = int(second_concat, 16)
+    decimal_result = decimal_of_second_concat / SECOND_CONCAT_SCALE
+    winning_ticket = round(decimal_result * int(inputs.total_number_of_tickets))
+    return DrawingResult(inputs.dfi_at_midnight, inputs.btc_at_midnight, multiply_dfi_by_btc, int(inputs.first_block_of_target_date),
+                         last_4_digits_of_block_hash, last_4_digits_of_block_minter, first_concat, sha256_result, second_concat,
+                         decimal_of_second_concat, decimal_result, int(inputs.total_number_of_tickets), winning_ticket)
+
+def multiply_prices(dfi_at_midnight, btc_at_midnight):
+    return round(float(btc_at_midnight) * float(dfi_at_midnight))
+
+def build_first_concat(multiply_dfi_by_btc, first_block_of_target_date, block_hash, minter):
+    return "{}{}{}{}".format(multiply_dfi_by_btc, first_block_of_target_date, block_hash[-4:], minter[-4:])
+
+def build_second_concat(sha256_result):
+    return "{}{}".format(sha256_result[0:5], sha256_result[-5:])
+
+def second_concat_value(first_concat):
+    # same value as int(build_second_concat(sha256_result), 16), read straight from the digest bytes for bulk use
+    digest = hashlib.sha256(first_concat.encode('utf-8')).digest()
+    return ((int.from_bytes(digest[:3], 'big') >> 4) << 20) | (int.from_bytes(digest[-3:], 'big') & 0xFFFFF)
@@ -0,0 +1,56 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from DfiTracer import DfiTracer
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_RETRIES = 3
+# sleeps 0.5s, 1s, 2s ... between retries
+DEFAULT_BACKOFF = 0.5
+DEFAULT_POOL_SIZE = 16
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+class DfiHttpSession:
+
+    # one keep-alive connection pool shared by every block lookup, so only the first request pays for TCP+TLS
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT, fixtures=None, tracer=None):
+        self.timeout = timeout
+        # a FixtureArchive to record every response into, or to replay them from without touching the network
+        self.fixtures = fixtures
+        self.tracer = tracer if tracer is not None else DfiTracer()
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                      status_forcelist=RETRY_STATUS_CODES, allowed_methods=["GET", "POST"], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        with self.tracer.span("http_request", method=method, url=url) as span:
+            if (self.fixtures is not None and self.fixtures.replay):
+                response = self.fixtures.get_http(method, url, kwargs.get("data"))
+                span["replayed"] = True
+            else:
+                kwargs.setdefault("timeout", self.timeout)
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except requests.RequestException as e:
+                    raise ValueError("ERROR requesting " + url + " after retries: " + str(e))
+                if (self.fixtures is not None):
+                    self.fixtures.put_http(method, url, kwargs.get("data"), response)
+                # urllib3 keeps the retries it made on the raw response
+                retries = getattr(response.raw, "retries", None)
+                span["retries"] = len(retries.history) if retries is not None else 0
+            span["status"] = response.status_code
+            span["bytes"] = len(response.content) if hasattr(response, "content") else len(response.text.encode("utf-8"))
+        return response
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,141 @@
+import csv, json, sys
+from argparse import RawDescriptionHelpFormatter
+from DfiDrawingEngine import DrawingInputs
+from DfiLotteryCalculator import add_shared_arguments
+
+BATCH_FORMATS = ["csv", "jsonl"]
+DEFAULT_JOBS = 4
+RESULT_FIELDS = ["row", "drawing", "target_date", "total_number_of_tickets", "dfi_at_midnight", "btc_at_midnight",
+                 "price_source", "multiply_dfi_by_btc", "first_block_of_target_date", "last_4_digits_of_block_hash",
+                 "last_4_digits_of_block_minter", "first_concat", "sha256_result", "second_concat",
+                 "decimal_of_second_concat", "decimal_result", "winning_ticket", "error"]
+
+class DfiLotteryBatch:
+
+    def __init__(self, logger, subparsers, calculator):
+        self.__logger = logger
+        self.__calculator = calculator
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Executes the DFI Community Lottery calculations for many drawings at once\n\nExample run:\npython3 ./dfi_lotto_calc.py -c dfi_lotto_calc.conf calc-batch -m drawings.csv -out results.csv\n\n####### Things to note: #######\n"+ \
+        "\t1. The manifest is a CSV file with a header row, or a JSONL file (one JSON object per line), with the columns date and tickets, plus optional block, dfi, btc and drawing.  block follows the same rules as calc -b, and can be left out for dates in the day index (see index-days).\n" + \
+        "\t2. Rows without dfi/btc prices are looked up on the -exchanges (default: KuCoin), so -ak/-as/-ap are only needed when a row is missing a price.  The price_source column names the exchange each price came from.\n" + \
+        "\t3. Every calculated row is recorded in the history store (see the history command), with the drawing column as its drawing number.  One client per exchange, one block cache and one HTTP connection pool are shared by all rows.  Prices are looked up once per date before the rows fan out, since calls to one exchange take turns anyway, so -j mostly runs the block searches of that many rows at the same time.  Results are written as each row finishes, so the output order is not the manifest order (see the row column).\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("calc-batch", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-m", "-manifest", dest="manifest", default=None, required=True,
+                                help="CSV or JSONL file listing the drawings to calculate")
+        sub_parser.add_argument("-out", dest="out", default="-", required=False,
+                                help="File to stream results to (default: - for stdout)")
+        sub_parser.add_argument("-f", "-format", dest="format", default=None, choices=BATCH_FORMATS,
+                                help="Output format (default: jsonl if -out ends in .jsonl, otherwise csv)")
+        sub_parser.add_argument("-j", "-jobs", dest="jobs", default=DEFAULT_JOBS, type=int, required=False,
+                                help="Number of drawings whose first block is searched for at the same time (default: "+str(DEFAULT_JOBS)+")")
+        add_shared_arguments(sub_parser)
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        self.__calculator.configure(args)
+        self.__calculator.quiet = True
+        rows = self.read_manifest(args.manifest)
+        output_format = args.format
+        if (output_format is None):
+            output_format = "jsonl" if args.out.endswith(".jsonl") else "csv"
+
+        if (args.out == "-"):
+            out = sys.stdout
+        else:
+            out = open(args.out, "w", newline="")
+        try:
+            writer = None
+            if (output_format == "csv"):
+                writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+                writer.writeheader()
+            failed = 0
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+            with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+                # submitted ahead of the rows, so no row waits on a lookup that is queued behind it
+                prices = self.prefetch_prices(rows, executor)
+                futures = [executor.submit(self.calculate_row, row_number, row, prices) for row_number, row in enumerate(rows, 1)]
+                for future in as_completed(futures):
+                    result = future.result()
+                    if (result["error"]):
+                        failed += 1
+                    if (writer is not None):
+                        writer.writerow(result)
+                    else:
+                        out.write(json.dumps(result) + "\n")
+                    out.flush()
+                    self.__logger.info("calc-batch result: " + json.dumps(result))
+        finally:
+            if (out is not sys.stdout):
+                out.close()
+        if (args.out != "-"):
+            print("calc-batch: ", len(rows) - failed, " of ", len(rows), " drawings calculated, results written to ", args.out)
+        if (failed):
+            raise ValueError(str(failed) + " of " + str(len(rows)) + " drawings failed, see the error column")
+
+    def read_manifest(self, manifest):
+        with open(manifest, newline="") as f:
+            if (manifest.endswith(".jsonl") or manifest.endswith(".json")):
+                rows = [json.loads(line) for line in f if line.strip()]
+            else:
+                rows = list(csv.DictReader(f))
+        # column names are matched case-insensitively, empty cells count as missing
+        return [{str(key).strip().lower(): value for key, value in row.items() if value not in (None, "")} for row in rows]
+
+    def prefetch_prices(self, rows, executor):
+        # one price lookup per date that a row needs prices for, the rows of that date share its future
+        from dateutil.parser import parse
+        dates = set()
+        for row in rows:
+            if (row.get("dfi") is None or row.get("btc") is None):
+                try:
+                    dates.add(parse(str(row["date"])))
+                except (KeyError, ValueError, OverflowError):
+                    # the row reports its own error when it runs
+                    continue
+        return {target_date: executor.submit(self.fetch_prices, target_date) for target_date in sorted(dates)}
+
+    def fetch_prices(self, target_date):
+        dfi_at_midnight, btc_at_midnight = self.__calculator.fetch_midnight_prices(target_date)
+        return dfi_at_midnight, btc_at_midnight, self.__calculator.get_price_source(target_date)
+
+    def calculate_row(self, row_number, row, prices):
+        result = dict.fromkeys(RESULT_FIELDS)
+        result["row"] = row_number
+        result["drawing"] = row.get("drawing")
+        result["target_date"] = row.get("date")
+        try:
+            from dateutil.parser import parse
+            target_date = parse(str(row["date"]))
+            total_number_of_tickets = int(row["tickets"])
+            result["total_number_of_tickets"] = total_number_of_tickets
+
+            if (row.get("dfi") is not None and row.get("btc") is not None):
+                dfi_at_midnight = float(row["dfi"])
+                btc_at_midnight = float(row["btc"])
+                result["price_source"] = "manifest"
+            else:
+                dfi_at_midnight, btc_at_midnight, price_source = prices[target_date].result()
+                if (not dfi_at_midnight or not btc_at_midnight):
+                    raise ValueError("could not determine prices at midnight of " + str(row["date"]) + ", add dfi and btc to the manifest")
+                result["price_source"] = price_source
+            result["dfi_at_midnight"] = dfi_at_midnight
+            result["btc_at_midnight"] = btc_at_midnight
+
+            first_block_of_target_date = self.__calculator.find_first_block(row.get("block"), target_date)
+            if (first_block_of_target_date == 0):
+                raise ValueError("block " + str(row["block"]) + " is not from " + str(row["date"]) + " or the day after")
+            result["first_block_of_target_date"] = first_block_of_target_date
+            header = self.__calculator.get_block_hash_timestamp_minter(first_block_of_target_date)
+            drawing_result = self.__calculator.compute_drawing(DrawingInputs(dfi_at_midnight, btc_at_midnight, first_block_of_target_date,
+                                                                             header.hash, header.minter, total_number_of_tickets))
+            result.update(drawing_result._asdict())
+            self.__calculator.record_result(drawing_result, target_date, row.get("drawing"), source="calc-batch",
+                                           price_source=result["price_source"])
+        except Exception as e:
+            result["error"] = repr(e)
+        return result
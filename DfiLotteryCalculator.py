@@ -1,118 +1,190 @@
-import ccxt, datetime, requests
+import atexit, csv, datetime, io, threading
 from argparse import RawDescriptionHelpFormatter
-from bs4 import BeautifulSoup
-from datetime import datetime
-from dateutil.parser import parse
-from cryptography.hazmat.primitives import hashes
+from datetime import datetime, timedelta, timezone
+from BlockHeaderCache import BlockHeaderCache
+from ChainDayIndex import ChainDayIndex
+from DfiDrawingEngine import DrawingInputs, compute_winning_ticket, multiply_prices
+from DfiBlockSource import BLOCK_SOURCES, DEFAULT_BLOCK_SOURCE, BlockHeader, BlockNotFound, create_block_source
+from DfiPriceSource import (DEFAULT_EXCHANGE_TIMEOUT, DEFAULT_EXCHANGES, DEFAULT_PRICE_POLICY, DRAWING_PRICE_INDEX, FAKE_EXCHANGE_PREFIX,
+                            PRICE_POLICIES, DfiPriceSource, FakeExchange, parse_exchanges)
+from DfiTracer import DfiTracer
+from DrawingHistory import DrawingHistory
+from FixtureArchive import FixtureArchive, FixtureExchange
+from PriceStore import PriceStore
+
+# DeFiChain targets a 30 second block time, used to estimate how far away midnight is
+AVERAGE_BLOCK_SECONDS = 30
+# block times are not monotonic, a block only has to be later than the median time of the 11 blocks before it
+MEDIAN_TIME_SPAN = 11
+DEFAULT_BLOCK_CACHE = "dfi_lotto_blocks.db"
+DEFAULT_PRICE_STORE = "dfi_lotto_prices.db"
+DEFAULT_HISTORY = "dfi_lotto_history.db"
+DEFAULT_DAY_INDEX = "dfi_lotto_days.db"
+# the drawing uses the 5 minute candle that starts at midnight UTC of the target date
+MIDNIGHT_CANDLE_TIMEFRAME = '5m'
+MIDNIGHT_CANDLE_MS = 5 * 60 * 1000
+# exchanges that answer a since query with an earlier page are walked forward at most this many pages
+MAX_OHLCV_PAGES = 10
+OHLCV_PAGE_LIMIT = 200
+
+def add_shared_arguments(sub_parser):
+    # options every command that resolves drawings needs: verbosity, KuCoin access and where DFI blocks come from
+    sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
+                            help="Set verbose option for more output/logging")
+    add_exchange_arguments(sub_parser)
+    add_block_arguments(sub_parser)
+    sub_parser.add_argument("-hs", "-history", dest="history", default=None, required=False,
+                            help="SQLite file drawing results are recorded in (default: "+DEFAULT_HISTORY+")")
+    sub_parser.add_argument("-nh", "-no_history", dest="no_history", action='store_true', required=False,
+                            help="Do not record the results in the history store")
+
+def add_exchange_arguments(sub_parser):
+    sub_parser.add_argument("-ak", "-api_key", dest="api_key", default=None, required=False,
+                            help="KuCoin API Key")
+    sub_parser.add_argument("-as", "-api_secret", dest="api_secret", default=None, required=False,
+                            help="KuCoin API Secret")
+    sub_parser.add_argument("-ap", "-api_password", dest="api_password", default=None, required=False,
+                            help="KuCoin API Password")
+    sub_parser.add_argument("-D", "-debug", dest="DEBUG", action='store_true', required=False,
+                            help="Debug mode (NOTE: This will set KuCoin to sandbox mode and use ETH/USDT instead of DFI/USDT for price metrics)")
+    sub_parser.add_argument("-ex", "-exchanges", dest="exchanges", default=None, required=False,
+                            help="Comma separated ccxt exchange ids the midnight candle is fetched from, in priority order (ex: kucoin,binance,gateio) (default: "+DEFAULT_EXCHANGES+")")
+    sub_parser.add_argument("-pp", "-price_policy", dest="price_policy", default=None, choices=PRICE_POLICIES,
+                            help="How the price is picked: primary (the first exchange that has the candle, the others are fallbacks) or median (of every exchange that answers) (default: "+DEFAULT_PRICE_POLICY+")")
+    sub_parser.add_argument("-et", "-exchange_timeout", dest="exchange_timeout", default=None, type=float, required=False,
+                            help="Seconds an exchange gets to answer before the price is decided without it (default: "+str(DEFAULT_EXCHANGE_TIMEOUT)+")")
+    sub_parser.add_argument("-fake_prices", dest="fake_prices", default=None, required=False,
+                            help="JSON file of candles served by the exchanges in -exchanges whose id starts with "+FAKE_EXCHANGE_PREFIX+", for offline runs")
+    sub_parser.add_argument("-ps", "-price_store", dest="price_store", default=None, required=False,
+                            help="SQLite file used to store fetched midnight candles between runs (default: "+DEFAULT_PRICE_STORE+")")
+    sub_parser.add_argument("-probe", dest="probe", action='store_true', required=False,
+                            help="Check the exchange connection with a ticker request before fetching prices")
+
+def add_block_arguments(sub_parser):
+    sub_parser.add_argument("-bc", "-block_cache", dest="block_cache", default=None, required=False,
+                            help="SQLite file used to cache DFI block headers between runs (default: "+DEFAULT_BLOCK_CACHE+")")
+    sub_parser.add_argument("-di", "-day_index", dest="day_index", default=None, required=False,
+                            help="SQLite file with the first block of every indexed date, built by index-days (default: "+DEFAULT_DAY_INDEX+")")
+    sub_parser.add_argument("-nc", "-no_cache", dest="no_cache", action='store_true', required=False,
+                            help="Do not read or write the block header cache, the price store or the day index")
+    sub_parser.add_argument("-bs", "-block_source", dest="block_source", default=None, choices=BLOCK_SOURCES,
+                            help="Where DFI block headers come from: defiscan (scrape https://defiscan.live/), rpc (DeFiChain node JSON-RPC) or fake (-fake_chain file, for offline runs) (default: "+DEFAULT_BLOCK_SOURCE+")")
+    sub_parser.add_argument("-rpc_url", dest="rpc_url", default=None, required=False,
+                            help="DeFiChain node JSON-RPC URL for -block_source rpc (ex: http://127.0.0.1:8554/)")
+    sub_parser.add_argument("-rpc_user", dest="rpc_user", default=None, required=False,
+                            help="DeFiChain node JSON-RPC user")
+    sub_parser.add_argument("-rpc_password", dest="rpc_password", default=None, required=False,
+                            help="DeFiChain node JSON-RPC password")
+    sub_parser.add_argument("-fake_chain", dest="fake_chain", default=None, required=False,
+                            help="JSON file of block headers served by -block_source fake")
+    sub_parser.add_argument("-record", dest="record", default=None, required=False,
+                            help="Record every block lookup and KuCoin response of this run into a fixture archive (ex: drawing5.json.gz)")
+    sub_parser.add_argument("-replay", dest="replay", default=None, required=False,
+                            help="Serve block lookups and KuCoin responses from a fixture archive made with -record, without touching the network")
+    sub_parser.add_argument("-w", "-prefetch_workers", dest="prefetch_workers", default=1, type=int, required=False,
+                            help="Number of blocks fetched in parallel around the current search point (default: 1, no prefetch)")
+    add_trace_arguments(sub_parser)
+
+def add_trace_arguments(sub_parser):
+    sub_parser.add_argument("-trace", "-trace_log", dest="trace_log", default=None, required=False,
+                            help="Append a JSON line for every block lookup, HTTP request, KuCoin call and drawing to this file")
+    sub_parser.add_argument("-metrics", "-metrics_file", dest="metrics_file", default=None, required=False,
+                            help="Write latency histograms and cache/HTTP counters of the run to this file in Prometheus text format")
+
+def format_csv_line(values):
+    # one properly quoted CSV line, so values with commas (like "First Block After ...") stay in their column
+    line = io.StringIO()
+    csv.writer(line, lineterminator="").writerow(values)
+    return line.getvalue()
 
 class DfiLotteryCalculator:
 
     def __init__(self, logger, subparsers):
         self.__logger = logger
+        self.__block_cache = None
+        self.__block_source = None
+        self.__prefetch_workers = 1
+        self.__prefetcher = None
+        self.__price_store = None
+        self.__history = None
+        self.__day_index = None
+        self.__fixtures = None
+        self.__exchanges = {}
+        self.__args = None
+        # every exchange client is created once, by whichever thread needs it first, under a lock of its own so a
+        # -probe of one exchange does not hold up the others
+        self.__exchange_lock = threading.Lock()
+        self.__exchange_creation_locks = {}
+        # where midnight prices come from, set up by configure
+        self.prices = None
+        # requests that actually left the process, read by the bench command
+        self.__counter_lock = threading.Lock()
+        self.block_fetches = 0
+        self.candle_fetches = 0
+        # disabled until -trace or -metrics is given
+        self.tracer = DfiTracer()
+        self.debug = False
+        self.verbose = False
+        # set by batch runs so concurrent block searches do not interleave their progress output
+        self.quiet = False
         self.__build_menu(subparsers)
 
     def __build_menu(self, subparsers):
         desc = "Executes the DFI Community Lottery calculations\n\nExample run:\npython3 ./dfi_lotto_calc.py -c dfi_lotto_calc.conf calc -t 60 -d 2022-02-05 -b 1598835 -dfi 2.793 -btc 41603.4\n\n####### Things to note: #######\n"+ \
-        "\t1. -b/-block_id argument must be a DFI blockchain block from the target date.  dfi_lotto_calc will attempt to find the first block from that day using https://defiscan.live/ , so the blockID can be given or the block hash.  This is done through a recursive function, which may fail if a beginning search block close enough to midnight is NOT picked.\n" + \
-        "\t2. If -D/-debug option is given the KuCoin sandbox mode will be used.  The sandbox does NOT have a DFI/USDT price, so ETH/USDT is used in it's place.  KuCoin's price history is not very extensive, so if the lookup fails the -dfi/-btc arguments MUST be provided.  If dfi_lotto_calc is run close enough to midnight the day of -d/target_date the KuCoin lookup should work!\n" + \
+        "\t1. If target_date is in the day index (see index-days) its first block is read from there and -b is not needed.  Otherwise the -b/-block_id argument must be a DFI blockchain block from the target date or the day after.  dfi_lotto_calc will find the first block from that day using https://defiscan.live/ , so the blockID can be given or the block hash.  The search interpolates on block height and timestamp, so only a handful of blocks are fetched no matter how far the given block is from midnight.\n" + \
+        "\t2. If -D/-debug option is given the KuCoin sandbox mode will be used.  The sandbox does NOT have a DFI/USDT price, so ETH/USDT is used in it's place.  Prices come from the KuCoin 5 minute candle that starts at midnight UTC of -d/target_date, which is asked for directly, so back-dated runs work as far back as KuCoin keeps 5 minute history.  Fetched candles are kept in a local price store (-ps/-price_store), so re-runs need no request at all.  -exchanges adds other ccxt exchanges that are asked at the same time and stand in for KuCoin when it has no candle or does not answer (see -price_policy).  -dfi/-btc still override the lookup, and MUST be provided if every exchange fails.\n" + \
             "###############################"
         sub_parser = subparsers.add_parser("calc", description=desc,
                                            formatter_class=RawDescriptionHelpFormatter)
-        sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
-                                help="Set verbose option for more output/logging")
         sub_parser.add_argument("-t", "-total_tickets", dest="total_tickets", default=None, required=True,
                                 help="Total # of lottery tickets for this drawing")
         sub_parser.add_argument("-d", "-target_date", dest="target_date", default=None, required=True,
                                 help="Date for this drawing (ex: 2022-02-05)")
-        sub_parser.add_argument("-b", "-block_id_from_date", dest="block_id_from_date", default=None, required=True,
-                                help="Block ID or Block Hash from target_date")
+        sub_parser.add_argument("-b", "-block_id_from_date", dest="block_id_from_date", default=None, required=False,
+                                help="Block ID or Block Hash from target_date (or the day after), only needed if target_date is not in the day index")
         sub_parser.add_argument("-dfi", "-dfi_price", dest="dfi_price", default=None, required=False,
                                 help="DFI/USDT price at midnight of target date on KuCoin")
         sub_parser.add_argument("-btc", "-btc_price", dest="btc_price", default=None, required=False,
                                 help="BTC/USDT price at midnight of target date on KuCoin")
-        sub_parser.add_argument("-ak", "-api_key", dest="api_key", default=None, required=False,
-                                help="KuCoin API Key")
-        sub_parser.add_argument("-as", "-api_secret", dest="api_secret", default=None, required=False,
-                                help="KuCoin API Secret")
-        sub_parser.add_argument("-ap", "-api_password", dest="api_password", default=None, required=False,
-                                help="KuCoin API Password")
-        sub_parser.add_argument("-D", "-debug", dest="DEBUG", action='store_true', required=False,
-                                help="Debug mode (NOTE: This will set KuCoin to sandbox mode and use ETH/USDT instead of DFI/USDT for price metrics)")
+        sub_parser.add_argument("-n", "-drawing", dest="drawing", default=None, type=int, required=False,
+                                help="Drawing number, recorded with the result in the history store")
+        add_shared_arguments(sub_parser)
         sub_parser.add_argument("-o", dest="outDir", default=".", help="Directory to write output files (default: .)")
         sub_parser.set_defaults(func=self.__main)
 
     def __main(self, args):
-        global DEBUG, verbose, defiscan_block_url, block_hash, timestamp, minter, next_block, prev_block
-        DEBUG=args.DEBUG
-        verbose=args.verbose
-
-        defiscan_block_url = 'https://defiscan.live/blocks/'
-        btc_symbol = 'BTC/USDT'
-        if (DEBUG):
-            dfi_symbol = 'ETH/USDT'
-        else:
-            dfi_symbol = 'DFI/USDT'
+        self.configure(args)
+        dfi_symbol, btc_symbol = self.get_symbols()
 
         #print(ccxt.exchanges) # print a list of all available exchange classes
 
         dfi_block_from_target_date = args.block_id_from_date
         target_date_string = args.target_date
         total_number_of_tickets = int(args.total_tickets)
-        if (verbose):
+        if (self.verbose):
             print("Init args:\n\tdfi_block_from_target_date:",dfi_block_from_target_date,"\n\ttarget_date_string:",target_date_string,"\n\ttotal_number_of_tickets:",total_number_of_tickets)
-        api_key = args.api_key
-        api_secret = args.api_secret
-        api_password = args.api_password
-        if (args.verbose):
-            print("KuCoin API args:\n\tapi_key:",api_key,"\n\tapi_secret:",api_secret,"\n\tapi_password:",api_password)
-
-        if (api_key is None or api_secret is None or api_password is None):
-            print("ERROR: KuCoin API details are NOT set!  Exiting!")
-            exit(1)
-
-        kucoin = ccxt.kucoin({
-            'apiKey': api_key,
-            'secret': api_secret,
-            "password": api_password
-        })
-        if (DEBUG):
-            print("DEBUG mode detected, setting Kucoin sandbox mode to TRUE")
-            kucoin.set_sandbox_mode(True)
-
-        # sample Kucoin request
-        print("Testing KuCoin connection...")
-        response = kucoin.fetch_ticker(btc_symbol)
-        if (not response or response is None):
-            print("FAILED!  Please verify your KuCoin API details (Hint: add verbose argument to print them to screen)")
-        else:
-            print("SUCCESS!")
-            if (verbose):
-                print(response)
 
+        from dateutil.parser import parse
         target_date = parse(target_date_string)
-        current_time = datetime.now()
-        if (target_date.year != current_time.year or target_date.month != current_time.month or target_date.day != current_time.day):
-            print("WARNING: target_date(",target_date,") is not today: ", current_time,"")
-            print("WARNING: KuCoin price history is NOT extensive, checking arguments for BTC and DFI price on target date...")
-            try:
-                if (args.btc_price is None or args.dfi_price is None):
-                    print("arguments btc_price and dfi_price MUST be set to continue!  Exiting!")
-                    exit(1)
-                else:
-                    dfi_at_midnight = float(args.dfi_price)
-                    btc_at_midnight = float(args.btc_price)
-            except:
-                print("arguments btc_price and dfi_price MUST be set to continue!  Exiting!")
-                exit(1)
+        first_block_of_target_date = None
+        price_source = None
+        if (args.dfi_price is not None and args.btc_price is not None):
+            print("Using ",dfi_symbol," & ",btc_symbol," prices at midnight of target_date (",target_date,") from arguments")
+            dfi_at_midnight = float(args.dfi_price)
+            btc_at_midnight = float(args.btc_price)
+            price_source = "arguments"
         else:
-            print("############# Fetching ",dfi_symbol," & ",btc_symbol," prices at midnight of target_date (",target_date,") from KuCoin #############")
-            btc_at_midnight = self.fetch_midnight_price_at_close(kucoin, btc_symbol, target_date)
-            dfi_at_midnight = self.fetch_midnight_price_at_close(kucoin, dfi_symbol, target_date)
+            # both candles and the block search only depend on target_date, so they run at the same time
+            print("############# Fetching ",dfi_symbol," & ",btc_symbol," prices at midnight of target_date (",target_date,") from ",", ".join(self.prices.exchanges)," (",self.prices.policy,") #############")
+            print("############# Determing first DFI chain block of target_date (",target_date,"), starting from block #",dfi_block_from_target_date or "(day index)"," #############")
+            dfi_at_midnight, btc_at_midnight, first_block_of_target_date = self.fetch_prices_and_first_block(target_date, dfi_block_from_target_date)
+            price_source = self.get_price_source(target_date)
 
         print("dfi_at_midnight: ", dfi_at_midnight)
         print("btc_at_midnight: ", btc_at_midnight)
+        print("price_source: ", price_source)
         if (not btc_at_midnight or btc_at_midnight is None or not dfi_at_midnight or dfi_at_midnight is None):
-            if (DEBUG):
+            if (self.debug):
                 if (dfi_at_midnight is None or not dfi_at_midnight):
                     print("WARNING!  Could not determine proper dfi_at_midnight, using 1.0")
                     dfi_at_midnight = 1.0
@@ -120,190 +192,514 @@ class DfiLotteryCalculator:
                     print("WARNING!  Could not determine proper btc_at_midnight, using 1.0")
                     btc_at_midnight = 1.0
             else:
-                print("ERROR: Could not determine prices for ",dfi_symbol," and/or ",btc_symbol, "!  Exiting!")
+                print("ERROR: Could not determine prices for ",dfi_symbol," and/or ",btc_symbol, "!  Add exchanges with -exchanges or pass them with -dfi/-btc.  Exiting!")
                 exit(1)
 
-        multiply_dfi_by_btc = round(btc_at_midnight * dfi_at_midnight)
+        print("multiply_dfi_by_btc: ", multiply_prices(dfi_at_midnight, btc_at_midnight))
 
-        print("multiply_dfi_by_btc: ", multiply_dfi_by_btc)
-
-        # TODO: narrow in
-        print("############# Determing first DFI chain block of target_date (",target_date,"), starting from block #",dfi_block_from_target_date," #############")
-        print("Please be patient, this could take awhile...")
-        first_block_of_target_date = self.narrow_in_on_first_block(dfi_block_from_target_date, target_date)
+        if (first_block_of_target_date is None):
+            print("############# Determing first DFI chain block of target_date (",target_date,"), starting from block #",dfi_block_from_target_date or "(day index)"," #############")
+            first_block_of_target_date = self.find_first_block(dfi_block_from_target_date, target_date)
         if (first_block_of_target_date == 0):
             print("ERROR: Could not determine first_block_of_target_date!  Exiting!")
             exit(1)
-        self.get_block_hash_timestamp_minter(first_block_of_target_date)
-
-        last_4_digits_of_block_hash = block_hash[len(block_hash)-4:len(block_hash)]
-        print("last_4_digits_of_block_hash: ", last_4_digits_of_block_hash)
-
-        last_4_digits_of_block_minter = minter[len(minter)-4:len(minter)]
-        print("last_4_digits_of_block_minter: ", last_4_digits_of_block_minter)
-
-        first_concat = "{}{}{}{}".format(multiply_dfi_by_btc,first_block_of_target_date,last_4_digits_of_block_hash,last_4_digits_of_block_minter)
-        print("first_concat: ", first_concat)
-
-        digest = hashes.Hash(hashes.SHA256())
-        digest.update(bytes(first_concat, 'utf-8'))
-        sha256_result = digest.finalize().hex()
-        print("sha256_result: ", sha256_result)
-
-        first5_of_hash = sha256_result[0:5]
-        last5_of_hash = sha256_result[len(sha256_result)-5:len(sha256_result)]
-        second_concat = "{}{}".format(first5_of_hash,last5_of_hash)
-        print("second_concat: ", second_concat)
-
-        # conversion to decimal
-        decimal_of_second_concat = int(second_concat, 16)
-        print("decimal_of_second_concat: ", decimal_of_second_concat)
-        decimal_result = decimal_of_second_concat / pow(16, 10)
-        print("decimal_result: ", decimal_result)
+        header = self.get_block_hash_timestamp_minter(first_block_of_target_date)
+
+        result = self.compute_drawing(DrawingInputs(dfi_at_midnight, btc_at_midnight, first_block_of_target_date,
+                                                      header.hash, header.minter, total_number_of_tickets))
+        print("last_4_digits_of_block_hash: ", result.last_4_digits_of_block_hash)
+        print("last_4_digits_of_block_minter: ", result.last_4_digits_of_block_minter)
+        print("first_concat: ", result.first_concat)
+        print("sha256_result: ", result.sha256_result)
+        print("second_concat: ", result.second_concat)
+        print("decimal_of_second_concat: ", result.decimal_of_second_concat)
+        print("decimal_result: ", result.decimal_result)
         print("total_number_of_tickets: ", total_number_of_tickets)
-        winning_ticket = round(decimal_result * total_number_of_tickets)
+        winning_ticket = result.winning_ticket
+        multiply_dfi_by_btc = result.multiply_dfi_by_btc
         print("\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         print("!!!!!!!!! winning_ticket: ", winning_ticket," !!!!!!!!!")
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
 
         print("############# CSV Output for Google Doc #############")
-        csv_header_string = "KuCoin USDT Price of DFI,KuCoin USDT Price of BTC,Result of Multiplication of Price of DFI and Price of BTC,First Block After ",target_date_string,",Last 4 digits of Block Hash,Last 4 digits of Block Minter,1st Concatenation,SHA-256 Hash,2nd Concatenation,Decimal,Number,Winning Ticket,Jackpot (DFI),Burned (DFI)"
+        csv_header = ["KuCoin USDT Price of DFI", "KuCoin USDT Price of BTC", "Result of Multiplication of Price of DFI and Price of BTC",
+                      "First Block After " + target_date_string, "Last 4 digits of Block Hash", "Last 4 digits of Block Minter",
+                      "1st Concatenation", "SHA-256 Hash", "2nd Concatenation", "Decimal", "Number", "Winning Ticket", "Jackpot (DFI)", "Burned (DFI)"]
+        # jackpot and burned amounts are not known to the calculator, the columns are left empty for the Google Doc
+        csv_row = [dfi_at_midnight, btc_at_midnight, multiply_dfi_by_btc, first_block_of_target_date, result.last_4_digits_of_block_hash,
+                   result.last_4_digits_of_block_minter, result.first_concat, result.sha256_result, result.second_concat,
+                   result.decimal_of_second_concat, result.decimal_result, winning_ticket, "", ""]
+        csv_header_string = format_csv_line(csv_header)
+        csv_logger_string = format_csv_line(csv_row)
         print(csv_header_string)
         self.__logger.info(csv_header_string)
-        csv_logger_string = dfi_at_midnight,",",btc_at_midnight,",",multiply_dfi_by_btc,",",first_block_of_target_date,",",last_4_digits_of_block_hash,",",last_4_digits_of_block_minter,",",first_concat,",",sha256_result,",",second_concat,",",decimal_result,",",winning_ticket,""
         print(csv_logger_string)
         self.__logger.info(csv_logger_string)
-
-    def fetch_midnight_price_at_close(self, kucoin, symbol, target_date):
-        #print(kucoin.fetch_ticker(symbol))
-        price_at_close = ''
-        timeframe = '5m'
-        since = None
-        '''
-        if (DEBUG):
-            since = None
+        self.record_result(result, target_date, args.drawing, price_source=price_source)
+
+    def configure(self, args, block_source=None):
+        # commands that never talk to KuCoin do not have the exchange options
+        self.debug = getattr(args, "DEBUG", False)
+        self.verbose = getattr(args, "verbose", False)
+        self.__args = args
+        # bench configures the same calculator more than once
+        self.__fixtures = None
+        self.__prefetcher = None
+        self.__block_cache = None
+        self.__price_store = None
+        self.__day_index = None
+        self.__exchanges = {}
+        self.__exchange_creation_locks = {}
+
+        if (not self.tracer.enabled and (args.trace_log is not None or args.metrics_file is not None)):
+            self.tracer = DfiTracer(args.trace_log, args.metrics_file)
+            atexit.register(self.tracer.close)
+
+        no_cache = args.no_cache
+        if (args.record is not None and args.replay is not None):
+            raise ValueError("-record and -replay cannot be used together")
+        if (args.record is not None or args.replay is not None):
+            self.__fixtures = FixtureArchive(args.replay or args.record, replay=args.replay is not None)
+            if (args.record is not None):
+                # saved on the way out, so a run that fails half way still leaves what it fetched
+                atexit.register(self.__fixtures.save)
+            # local stores would answer some lookups without a request, every lookup has to go through the archive
+            no_cache = True
+
+        self.__prefetch_workers = max(args.prefetch_workers, 1)
+        pool_size = self.__prefetch_workers * max(getattr(args, "jobs", 1), 1)
+        # bench brings its own synthetic block source
+        if (block_source is None and getattr(args, "block_source", None) == "fake"):
+            # the fake chain is read from a file, only the network sources need an HTTP session
+            block_source = create_block_source(args)
+        elif (block_source is None):
+            from DfiHttpSession import DfiHttpSession
+            # header streams (headers, index-days -stream) keep -stream_workers batches in flight, each on its own connection
+            session_size = max(pool_size, getattr(args, "stream_workers", 1))
+            block_source = create_block_source(args, DfiHttpSession(pool_size=session_size, fixtures=self.__fixtures, tracer=self.tracer))
+        self.__block_source = block_source
+        if (self.__prefetch_workers > 1):
+            from concurrent.futures import ThreadPoolExecutor
+            self.__prefetcher = ThreadPoolExecutor(max_workers=pool_size)
+        if (not no_cache):
+            self.__block_cache = BlockHeaderCache(args.block_cache or DEFAULT_BLOCK_CACHE)
+            self.__price_store = PriceStore(getattr(args, "price_store", None) or DEFAULT_PRICE_STORE)
+            self.__day_index = ChainDayIndex(getattr(args, "day_index", None) or DEFAULT_DAY_INDEX)
+        self.prices = DfiPriceSource(self, self.__price_store, MIDNIGHT_CANDLE_TIMEFRAME,
+                                     parse_exchanges(getattr(args, "exchanges", None) or DEFAULT_EXCHANGES),
+                                     getattr(args, "price_policy", None) or DEFAULT_PRICE_POLICY,
+                                     float(getattr(args, "exchange_timeout", None) or DEFAULT_EXCHANGE_TIMEOUT))
+        if (not getattr(args, "no_history", True)):
+            self.__history = DrawingHistory(getattr(args, "history", None) or DEFAULT_HISTORY)
+
+    def compute_drawing(self, inputs):
+        # the hashing step, traced like the lookups that feed it
+        with self.tracer.span("drawing", first_block_of_target_date=inputs.first_block_of_target_date) as span:
+            result = compute_winning_ticket(inputs)
+            span["winning_ticket"] = result.winning_ticket
+        return result
+
+    def record_result(self, result, target_date, drawing=None, source="calc", price_source=None):
+        # every computed drawing becomes a queryable row, see the history command
+        if (self.__history is not None):
+            self.__history.put(result, target_date, drawing, source, price_source)
+
+    def get_symbols(self):
+        btc_symbol = 'BTC/USDT'
+        if (self.debug):
+            dfi_symbol = 'ETH/USDT'
+        else:
+            dfi_symbol = 'DFI/USDT'
+        return dfi_symbol, btc_symbol
+
+    def create_exchange(self, exchange_id="kucoin"):
+        args = self.__args
+        if (self.__fixtures is not None and self.__fixtures.replay):
+            # replayed responses need no KuCoin account
+            return FixtureExchange(self.__fixtures, self.get_exchange_id(exchange_id))
+        if (exchange_id.startswith(FAKE_EXCHANGE_PREFIX)):
+            return FakeExchange.from_file(getattr(args, "fake_prices", None), exchange_id, self.prices.timeout)
+        options = {'timeout': int(self.prices.timeout * 1000)}
+        if (exchange_id == "kucoin"):
+            api_key = args.api_key
+            api_secret = args.api_secret
+            api_password = args.api_password
+            if (args.verbose):
+                print("KuCoin API args:\n\tapi_key:",api_key,"\n\tapi_secret:",api_secret,"\n\tapi_password:",api_password)
+
+            if (api_key is None or api_secret is None or api_password is None):
+                # raised, not exited: clients are created on batch and price pool threads, where a missing
+                # price only fails its own row and the other exchanges can still stand in for KuCoin
+                raise ValueError("KuCoin API details are NOT set, pass -ak/-as/-ap or set them in the config file")
+            options.update({
+                'apiKey': api_key,
+                'secret': api_secret,
+                "password": api_password
+            })
+
+        # ccxt takes about half a second to import, only runs that really talk to an exchange pay for it
+        import ccxt
+        exchange_class = getattr(ccxt, exchange_id, None)
+        if (exchange_class is None):
+            raise ValueError("unknown exchange '" + exchange_id + "', -exchanges takes ccxt exchange ids")
+        exchange = exchange_class(options)
+        if (self.debug and exchange_id == "kucoin"):
+            print("DEBUG mode detected, setting Kucoin sandbox mode to TRUE")
+            exchange.set_sandbox_mode(True)
+        if (self.__fixtures is not None):
+            return FixtureExchange(self.__fixtures, self.get_exchange_id(exchange_id), exchange)
+        return exchange
+
+    def get_exchange(self, exchange_id=None):
+        # each exchange client is only created (and probed) the first time a price actually has to be fetched from it
+        exchange_id = exchange_id or self.prices.exchanges[0]
+        with self.__exchange_lock:
+            if (exchange_id in self.__exchanges):
+                return self.__exchanges[exchange_id]
+            creation_lock = self.__exchange_creation_locks.setdefault(exchange_id, threading.Lock())
+        with creation_lock:
+            with self.__exchange_lock:
+                if (exchange_id in self.__exchanges):
+                    return self.__exchanges[exchange_id]
+            exchange = self.create_exchange(exchange_id)
+            if (self.__args.probe):
+                self.report_exchange_connection(self.fetch_ticker(exchange, self.get_symbols()[1], exchange_id), exchange_id)
+            with self.__exchange_lock:
+                self.__exchanges[exchange_id] = exchange
+            return exchange
+
+    def get_exchange_id(self, exchange_id="kucoin"):
+        # sandbox candles are not real prices, keep them apart from the real ones in the price store
+        if (self.debug and exchange_id == "kucoin"):
+            return 'kucoin-sandbox'
+        return exchange_id
+
+    def report_exchange_connection(self, response, exchange_id="kucoin"):
+        # sample Kucoin request
+        print("Testing " + exchange_id + " connection...")
+        if (not response or response is None):
+            if (exchange_id == "kucoin"):
+                print("FAILED!  Please verify your KuCoin API details (Hint: add verbose argument to print them to screen)")
+            else:
+                print("FAILED!")
         else:
-            since = int(round(target_date.timestamp()))
-            print("Setting KuCoin since date to: ",target_date,"(",since,")")
-        '''
-        limit = 1000
-        ohlcvs = kucoin.fetch_ohlcv(symbol, timeframe, since, limit)
-        #print(ohlcvs)
+            print("SUCCESS!")
+            if (self.verbose):
+                print(response)
 
-        beginning_of_target_date = datetime(target_date.year, target_date.month, target_date.day)
-        #print("beginning_of_target_date: ", beginning_of_target_date)
-        for candle in ohlcvs:
-            if (verbose):
-                print(candle)
-            # candle[0] = Start time of the candle cycle
-            # candle[1] = open
-            # candle[2] = close
-            # candle[3] = high
-            # candle[4] = low
-            # candle[5] = volume
-            # candle[6] = turnover
-
-            dt_object = datetime.fromisoformat(kucoin.iso8601(candle[0]).replace("Z", ""))
-            if (dt_object == beginning_of_target_date):
-                price_at_close = candle[2]
-                #print('from', dt_object,candle[1], "price_at_close:", price_at_close)
-        if (DEBUG):
+    def report_exchange_failure(self, message):
+        # an exchange that is slow or down only costs a warning, the price is decided by the ones that answered
+        if (not self.quiet):
+            print("WARNING!  " + message)
+        self.__logger.warning("prices: " + message)
+
+    def fetch_midnight_prices(self, target_date):
+        dfi_symbol, btc_symbol = self.get_symbols()
+        btc_at_midnight = self.fetch_midnight_price_at_close(btc_symbol, target_date)
+        dfi_at_midnight = self.fetch_midnight_price_at_close(dfi_symbol, target_date)
+        return dfi_at_midnight, btc_at_midnight
+
+    def fetch_prices_and_first_block(self, target_date, block_from_date):
+        # both quotes and the block search are blocking HTTP, each runs on a worker thread so a live drawing takes
+        # about as long as the slowest of the three.  The quotes go through the same price source as every other run
+        from concurrent.futures import ThreadPoolExecutor
+        dfi_symbol, btc_symbol = self.get_symbols()
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="drawing") as pool:
+            futures = [pool.submit(self.fetch_midnight_price_at_close, dfi_symbol, target_date),
+                       pool.submit(self.fetch_midnight_price_at_close, btc_symbol, target_date),
+                       pool.submit(self.find_first_block, block_from_date, target_date)]
+            return [future.result() for future in futures]
+
+    def fetch_ticker(self, exchange, symbol, exchange_id="kucoin"):
+        with self.tracer.span("exchange_call", method="fetch_ticker", exchange=exchange_id, symbol=symbol):
+            return exchange.fetch_ticker(symbol)
+
+    def fetch_midnight_price_at_close(self, symbol, target_date):
+        return self.get_quote_price(self.prices.quote(symbol, self.get_midnight_timestamp(target_date)))
+
+    def get_quote_price(self, quote):
+        # '' when no exchange had the candle, like a missing candle always was
+        if (quote is None):
+            return ''
+        return quote.price
+
+    def get_price_source(self, target_date):
+        # which exchange each midnight price came from, one name when both came from the same one
+        timestamp = self.get_midnight_timestamp(target_date)
+        sources = [(symbol, self.prices.get_source(symbol, timestamp)) for symbol in self.get_symbols()]
+        if (any(source is None for symbol, source in sources)):
+            return None
+        if (sources[0][1] == sources[1][1]):
+            return sources[0][1]
+        return ", ".join(symbol + " " + source for symbol, source in sources)
+
+    def get_midnight_timestamp(self, target_date):
+        # candles are keyed by their start time in ms, the one we want starts at midnight UTC of target_date
+        return int(datetime(target_date.year, target_date.month, target_date.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+    def get_stored_candle(self, symbol, timestamp, exchange_id="kucoin"):
+        if (self.__price_store is None):
+            return None
+        with self.tracer.span("candle_lookup", exchange=exchange_id, symbol=symbol, timestamp=timestamp) as span:
+            candle = self.__price_store.get(self.get_exchange_id(exchange_id), symbol, MIDNIGHT_CANDLE_TIMEFRAME, timestamp)
+            span["cache"] = "miss" if candle is None else "hit"
+        return candle
+
+    def store_candle(self, symbol, candle, exchange_id="kucoin"):
+        if (candle is not None and self.__price_store is not None and self.is_candle_closed(candle[0])):
+            self.__price_store.put(self.get_exchange_id(exchange_id), symbol, MIDNIGHT_CANDLE_TIMEFRAME, candle)
+
+    def is_candle_closed(self, timestamp):
+        # a candle is only final once its 5 minutes are over
+        now = int(datetime.now(timezone.utc).timestamp() * 1000)
+        return timestamp + MIDNIGHT_CANDLE_MS <= now
+
+    def get_price_from_candle(self, candle):
+        price_at_close = ''
+        if (self.verbose):
+            print(candle)
+        if (candle is not None):
+            price_at_close = candle[DRAWING_PRICE_INDEX]
+        if (self.debug):
             print("price at midnight: ", price_at_close)
         return price_at_close
 
-    def narrow_in_on_first_block(self, block_from_date, target_date):
-        global block_hash, timestamp, minter, next_block, prev_block
+    def fetch_candle(self, exchange, symbol, timeframe, timestamp, exchange_id="kucoin"):
+        # ask for the single candle that starts at timestamp instead of scanning the latest 1000
+        since, limit = timestamp, 1
+        for page in range(MAX_OHLCV_PAGES):
+            self.count_fetch("candle_fetches")
+            with self.tracer.span("exchange_call", method="fetch_ohlcv", exchange=exchange_id, symbol=symbol, since=since, limit=limit) as span:
+                ohlcvs = exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+                span["rows"] = len(ohlcvs) if ohlcvs else 0
+            candle, since = self.find_candle_in_page(ohlcvs, timestamp)
+            if (since is None):
+                return candle
+            limit = OHLCV_PAGE_LIMIT
+        return None
+
+    def count_fetch(self, counter, count=1):
+        with self.__counter_lock:
+            setattr(self, counter, getattr(self, counter) + count)
+
+    def find_candle_in_page(self, ohlcvs, timestamp):
+        # returns (candle, None) when the search is over, or (None, since) for the next page to ask for
+        if (not ohlcvs):
+            return None, None
+        for candle in ohlcvs:
+            if (candle[0] == timestamp):
+                return candle, None
+        if (ohlcvs[-1][0] >= timestamp):
+            # the exchange has no candle at exactly that time
+            return None, None
+        # this exchange returned an earlier page, keep walking forward from the last candle it gave us
+        return None, ohlcvs[-1][0] + 1
+
+    def find_first_block(self, block_from_date, target_date):
+        # a date that index-days already covered is a single local read, otherwise search from the given block
+        with self.tracer.span("first_block_search", target_date=target_date.strftime("%Y-%m-%d")) as span:
+            first_block_of_target_date = None
+            if (self.__day_index is not None):
+                first_block_of_target_date = self.__day_index.get(target_date.strftime("%Y-%m-%d"))
+            if (first_block_of_target_date is not None):
+                span["source"] = "day_index"
+                if (not self.quiet):
+                    print("first_block_of_target_day: ", first_block_of_target_date, " (from the day index)")
+            else:
+                if (block_from_date is None):
+                    raise ValueError("target date " + target_date.strftime("%Y-%m-%d") + " is not in the day index, run index-days or pass a block from that date with -b")
+                span["source"] = "search"
+                first_block_of_target_date = self.narrow_in_on_first_block(block_from_date, target_date)
+            span["first_block"] = first_block_of_target_date
+        return first_block_of_target_date
 
-        # first, let's check that block_from_date matches our target_date
-        self.get_block_hash_timestamp_minter(block_from_date)
-        timestamp_date = parse(timestamp)
+    def narrow_in_on_first_block(self, block_from_date, target_date):
+        # first, let's check that block_from_date is from our target_date (or the day after it)
+        header = self.get_block_hash_timestamp_minter(block_from_date)
+        from dateutil.parser import parse
+        timestamp_date = parse(header.timestamp)
+        beginning_of_target_date = datetime(target_date.year, target_date.month, target_date.day)
         #print("target_date: ", target_date)
         #print("timestamp_date: ", timestamp_date)
-        if (target_date.year != timestamp_date.year or target_date.month != timestamp_date.month or target_date.day != timestamp_date.day):
-            print("Error: block_from_date(",block_from_date,") is not from target_date: ", target_date)
+        if (timestamp_date < beginning_of_target_date or timestamp_date >= beginning_of_target_date + timedelta(days=2)):
+            print("Error: block_from_date(",block_from_date,") is not from target_date or the day after: ", target_date)
             return 0
         first_block_of_target_date = self.find_first_block_of_date(block_from_date, target_date)
         return first_block_of_target_date
 
     def find_first_block_of_date(self, block, target_date):
-        self.get_block_hash_timestamp_minter(block)
-        print("#### Examining block #",block,":",timestamp)
-        timestamp_date = parse(timestamp)
-        if ((target_date.day - 1) == timestamp_date.day):
-            print("first_block_of_target_day: ", next_block)
-            return next_block
+        # Interpolation search on (block height, block time): estimate where midnight falls from the average
+        # block time, gallop until midnight is bracketed, then alternate interpolation and bisection steps so
+        # the number of fetches stays O(log n) even when block times are uneven.  With -prefetch_workers > 1
+        # every round fetches several candidate blocks in parallel and narrows the bracket by all of them.
+        beginning_of_target_date = datetime(target_date.year, target_date.month, target_date.day)
+        height, time = self.get_block_height_and_time(block)
+
+        if (time >= beginning_of_target_date):
+            hi_height, hi_time = height, time
+            step = self.estimate_blocks_between(beginning_of_target_date, hi_time)
+            lo_height = None
+            while (lo_height is None):
+                if (hi_height == 0):
+                    if (not self.quiet):
+                        print("first_block_of_target_day: ", hi_height)
+                    return hi_height
+                probes = sorted(set(max(0, hi_height - step * (i + 1)) for i in range(self.__prefetch_workers)), reverse=True)
+                times = self.get_block_times(probes)
+                for probe in probes:
+                    if (times[probe] < beginning_of_target_date):
+                        lo_height, lo_time = probe, times[probe]
+                        break
+                    hi_height, hi_time = probe, times[probe]
+                step = max(step * 2, self.estimate_blocks_between(beginning_of_target_date, hi_time))
+        else:
+            lo_height, lo_time = height, time
+            step = self.estimate_blocks_between(lo_time, beginning_of_target_date)
+            hi_height = None
+            beyond_tip = None
+            while (hi_height is None):
+                if (beyond_tip is not None):
+                    if (beyond_tip - lo_height <= 1):
+                        raise BlockNotFound("block " + str(lo_height) + " is the tip of the chain, " + beginning_of_target_date.strftime("%Y-%m-%d") + " has not started on chain yet")
+                    step = min(step, max(1, (beyond_tip - lo_height) // (self.__prefetch_workers + 1)))
+                probes = sorted(set(lo_height + step * (i + 1) for i in range(self.__prefetch_workers)
+                                    if (beyond_tip is None or lo_height + step * (i + 1) < beyond_tip)))
+                try:
+                    times = self.get_block_times(probes)
+                except BlockNotFound:
+                    # block sources cannot serve blocks past the tip of the chain, gallop back towards lo_height
+                    beyond_tip = probes[-1] if beyond_tip is None else min(beyond_tip, probes[-1])
+                    continue
+                for probe in probes:
+                    if (times[probe] >= beginning_of_target_date):
+                        hi_height, hi_time = probe, times[probe]
+                        break
+                    lo_height, lo_time = probe, times[probe]
+                step = max(step * 2, self.estimate_blocks_between(lo_time, beginning_of_target_date))
+
+        interpolate = True
+        while (hi_height - lo_height > 1):
+            probes = self.pick_probes(lo_height, lo_time, hi_height, hi_time, beginning_of_target_date, interpolate)
+            interpolate = not interpolate
+            times = self.get_block_times(probes)
+            for probe in probes:
+                if (times[probe] < beginning_of_target_date):
+                    lo_height, lo_time = probe, times[probe]
+                else:
+                    hi_height, hi_time = probe, times[probe]
+                    break
+
+        hi_height = self.settle_first_block(hi_height, beginning_of_target_date)
+        if (not self.quiet):
+            print("first_block_of_target_day: ", hi_height)
+        return hi_height
+
+    def settle_first_block(self, first_block, beginning_of_target_date):
+        # the search stops at a block right after a pre-midnight one, but a block can carry a time earlier than its
+        # parent's, so a later block may still be from before midnight.  The first block of the day is the one after the
+        # last pre-midnight block, like the old walk back found: once MEDIAN_TIME_SPAN blocks in a row are past midnight
+        # no later block can be before it, so only that window after the candidate has to be checked
+        from dateutil.parser import parse
+        next_height = first_block + 1
+        while (next_height < first_block + MEDIAN_TIME_SPAN):
+            heights = list(range(next_height, first_block + MEDIAN_TIME_SPAN))
+            headers = self.get_block_headers(heights)
+            for header in headers:
+                if (parse(header.timestamp) < beginning_of_target_date):
+                    first_block = header.height + 1
+            if (len(headers) < len(heights)):
+                # the tip of the chain
+                break
+            next_height = heights[-1] + 1
+        return first_block
+
+    def pick_probes(self, lo_height, lo_time, hi_height, hi_time, beginning_of_target_date, interpolate):
+        workers = self.__prefetch_workers
+        if (interpolate and hi_time > lo_time):
+            fraction = (beginning_of_target_date - lo_time).total_seconds() / (hi_time - lo_time).total_seconds()
+            center = lo_height + int(round(fraction * (hi_height - lo_height)))
+            # block times only drift a little from the average, so the extra probes sit in a tight window around the estimate
+            spacing = max(1, (hi_height - lo_height) // (64 * workers))
+            probes = [center + int(round((i - (workers - 1) / 2.0) * spacing)) for i in range(workers)]
         else:
-            return self.find_first_block_of_date(prev_block, target_date)
+            # k-ary split, every round shrinks the bracket workers+1 times
+            probes = [lo_height + (hi_height - lo_height) * (i + 1) // (workers + 1) for i in range(workers)]
+        return sorted(set(min(max(probe, lo_height + 1), hi_height - 1) for probe in probes))
+
+    def get_block_times(self, blocks):
+        if (self.__prefetcher is None or len(blocks) == 1):
+            return {block: self.get_block_height_and_time(block)[1] for block in blocks}
+        return {block: height_and_time[1] for block, height_and_time in zip(blocks, self.__prefetcher.map(self.get_block_height_and_time, blocks))}
+
+    def estimate_blocks_between(self, earlier, later):
+        # +1 so the first guess lands just past the boundary rather than just short of it
+        return int((later - earlier).total_seconds() // AVERAGE_BLOCK_SECONDS) + 1
+
+    def get_block_height_and_time(self, block):
+        header = self.get_block_hash_timestamp_minter(block)
+        if (not self.quiet):
+            print("#### Examining block #",block,":",header.timestamp)
+        from dateutil.parser import parse
+        return header.height, parse(header.timestamp)
 
     def get_block_hash_timestamp_minter(self, block):
-        global block_hash, timestamp, minter, next_block, prev_block
-        # the target we want to open
-        url=defiscan_block_url+str(block)
-
-        #open with GET method
-        #print("#### ", block, " #### : Fetching DFI block info from URL: ", url)
-        resp=requests.get(url)
-
-        #http_respone 200 means OK status
-        if resp.status_code==200:
-            #print("Successfully opened the web page")
-
-            # we need a parser, Python built-in HTML parser is enough .
-            soup=BeautifulSoup(resp.text,'html.parser')
-
-            # block_hash_search is the list which contains all the text in the tag we are searching for
-            block_hash_search=soup.find("div",{"class":"ml-1 text-lg break-all"})
-            #print(block_hash_search)
-            block_hash = self.parse_value_from_div(block_hash_search)
-            if (verbose):
-                print("#### ", block, " #### : block_hash : ", block_hash)
-
-            timestamp_field_search=soup.findAll("div",{"class":"table-cell px-4 md:px-6 py-3 text-gray-600 align-middle"})
-            #print(timestamp_field_search)
-            timestamp = self.parse_value_from_div(timestamp_field_search[2])
-            if (verbose):
-                print("#### ", block, " #### : timestamp  : ", timestamp)
-
-            prev_block = self.parse_value_from_div_with_url2(timestamp_field_search[len(timestamp_field_search)-2])
-            if (verbose):
-                print("#### ", block, " #### : prev_block : ", prev_block)
-
-            next_block = self.parse_value_from_div_with_url2(timestamp_field_search[len(timestamp_field_search)-1])
-            if (verbose):
-                print("#### ", block, " #### : next_block : ", next_block)
-
-            minter_search=soup.find("div",{"class":"hover:underline text-blue-500 cursor-pointer break-all"})
-            #print(minter_search)
-            minter = self.parse_value_from_div_with_url(minter_search)
-            if (verbose):
-                print("#### ", block, " #### : minter     : ", minter)
-
-            return block_hash
-        else:
-            print("ERROR fetching DFI block info from URL: ", url)
-
-    def parse_value_from_div(self, html):
-        splitter1 = str(html).split(">")
-        #print(splitter1)
-        splitter2 = splitter1[1].split("<")
-        #print(splitter2)
-        value = splitter2[0]
-        return value
-
-    def parse_value_from_div_with_url(self, html):
-        splitter1 = str(html).split(">")
-        #print(splitter1)
-        splitter2 = splitter1[2].split("<")
-        #print(splitter2)
-        value = splitter2[0]
-        return value
-
-    def parse_value_from_div_with_url2(self, html):
-        splitter1 = str(html).split(">")
-        #print(splitter1)
-        splitter2 = splitter1[3].split("<")
-        #print(splitter2)
-        splitter3 = splitter2[0].split("#")
-        #print(splitter3)
-        value = splitter3[1]
-        return value
\ No newline at end of file
+        # block headers never change once confirmed, so check the local cache before going to the block source
+        header = None
+        with self.tracer.span("block_lookup", block=str(block)) as span:
+            if (self.__block_cache is not None):
+                cached = self.__block_cache.get(block)
+                if (cached is not None):
+                    header = BlockHeader(*cached)
+                    span["cache"] = "hit"
+                    if (self.verbose):
+                        print("#### ", block, " #### : cached")
+            if (header is None):
+                span["cache"] = "off" if self.__block_cache is None else "miss"
+                self.count_fetch("block_fetches")
+                header = self.__block_source.get_block(block)
+                # only cache blocks that already have a successor, the tip of the chain can still change
+                if (self.__block_cache is not None and header.height is not None and header.next_block is not None):
+                    self.__block_cache.put(*header)
+
+        if (self.verbose):
+            print("#### ", block, " #### : block_hash : ", header.hash)
+            print("#### ", block, " #### : timestamp  : ", header.timestamp)
+            print("#### ", block, " #### : prev_block : ", header.prev_block)
+            print("#### ", block, " #### : next_block : ", header.next_block)
+            print("#### ", block, " #### : minter     : ", header.minter)
+        return header
+
+    def get_block_headers(self, heights):
+        # a run of consecutive heights at once: cached headers come from one range read and the rest from the block
+        # source in bulk where it supports that (rpc batches), otherwise block by block.  The list stops short at the tip.
+        with self.tracer.span("block_batch", first=heights[0], count=len(heights)) as span:
+            headers = {}
+            if (self.__block_cache is not None):
+                for cached in self.__block_cache.get_range(heights[0], heights[-1]):
+                    headers[cached[0]] = BlockHeader(*cached)
+            missing = [height for height in heights if height not in headers]
+            span["cache_hits"] = len(headers)
+            if (missing):
+                fetched = []
+                if (hasattr(self.__block_source, "get_blocks")):
+                    fetched = self.__block_source.get_blocks(missing)
+                else:
+                    for height in missing:
+                        try:
+                            fetched.append(self.__block_source.get_block(height))
+                        except BlockNotFound:
+                            # nothing past the tip of the chain
+                            break
+                self.count_fetch("block_fetches", len(fetched))
+                for header in fetched:
+                    headers[header.height] = header
+                # only cache blocks that already have a successor, the tip of the chain can still change
+                if (self.__block_cache is not None):
+                    self.__block_cache.put_many([header for header in fetched if header.next_block is not None])
+            span["headers"] = len(headers)
+        result = []
+        for height in heights:
+            if (height not in headers):
+                break
+            result.append(headers[height])
+        return result
@@ -0,0 +1,124 @@
+import time
+from argparse import RawDescriptionHelpFormatter
+from datetime import datetime, timedelta, timezone
+from ChainDayIndex import ChainDayIndex
+from DfiBlockSource import BlockNotFound
+from DfiLotteryCalculator import DEFAULT_DAY_INDEX, MEDIAN_TIME_SPAN, add_block_arguments
+from HeaderStream import DEFAULT_BATCH_SIZE, DEFAULT_STREAM_WORKERS, HeaderStream
+
+class DfiLotteryDayIndex:
+
+    def __init__(self, logger, subparsers, calculator):
+        self.__logger = logger
+        self.__calculator = calculator
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Indexes the first DFI chain block of every date, so calc no longer needs -b\n\nExample run:\npython3 ./dfi_lotto_calc.py index-days -from 2022-01-01 -b 1518335\n\n####### Things to note: #######\n"+ \
+        "\t1. The first run needs -from, the first date to index.  -b is an optional block from around that date to start the search from, without it the search starts at the genesis block.\n" + \
+        "\t2. Later runs carry on from the last indexed date, starting each day's search from the previous day's first block, so only a few blocks are fetched per day.  Run it from cron to keep the index current.\n" + \
+        "\t3. Indexing stops at -to (default: today, UTC) or when the search runs past the tip of the chain, whichever comes first.  Every date is saved as soon as it is found, so an interrupted run loses nothing.\n" + \
+        "\t4. -stream reads every header after the first indexed day in batches (-stream_batch, -stream_workers in flight) instead of searching each day.  With -bs rpc a batch is two JSON-RPC calls, so long catch-ups need far fewer round trips and the headers end up in the block cache for audits.\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("index-days", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
+                                help="Set verbose option for more output/logging")
+        sub_parser.add_argument("-from", dest="date_from", default=None, required=False,
+                                help="First date to index when the day index is empty (ex: 2022-01-01)")
+        sub_parser.add_argument("-to", dest="date_to", default=None, required=False,
+                                help="Last date to index (default: today, UTC)")
+        sub_parser.add_argument("-b", "-block_id", dest="block_id", default=None, required=False,
+                                help="Block ID or Block Hash near -from to start the first search from (default: 0)")
+        sub_parser.add_argument("-stream", dest="stream", action='store_true', required=False,
+                                help="Walk every block header in batches instead of searching each day, best with -bs rpc")
+        sub_parser.add_argument("-stream_batch", dest="stream_batch", default=DEFAULT_BATCH_SIZE, type=int, required=False,
+                                help="Block headers per batch with -stream (default: "+str(DEFAULT_BATCH_SIZE)+")")
+        sub_parser.add_argument("-stream_workers", dest="stream_workers", default=DEFAULT_STREAM_WORKERS, type=int, required=False,
+                                help="Batches fetched at the same time with -stream (default: "+str(DEFAULT_STREAM_WORKERS)+")")
+        add_block_arguments(sub_parser)
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        start = time.time()
+        day_index = ChainDayIndex(args.day_index or DEFAULT_DAY_INDEX)
+        try:
+            self.__calculator.configure(args)
+            self.__calculator.quiet = not args.verbose
+            from dateutil.parser import parse
+            today = datetime.now(timezone.utc).replace(tzinfo=None)
+            date_to = today if args.date_to is None else min(parse(args.date_to), today)
+
+            last = day_index.last()
+            if (last is not None):
+                date, block = parse(last[0]) + timedelta(days=1), last[1]
+            elif (args.date_from is not None):
+                date, block = parse(args.date_from), args.block_id or 0
+            else:
+                raise ValueError("the day index is empty, give the first date to index with -from")
+            date = datetime(date.year, date.month, date.day)
+
+            indexed = 0
+            while (date <= date_to):
+                try:
+                    with self.__calculator.tracer.span("index_day", date=date.strftime("%Y-%m-%d")) as span:
+                        block = self.__calculator.find_first_block_of_date(block, date)
+                        span["first_block"] = block
+                except BlockNotFound as e:
+                    # the block source cannot serve blocks past the tip, so the chain has not reached this date yet.
+                    # Any other error (an outage half way through) ends the run as an error instead
+                    print("stopping at ", date.strftime("%Y-%m-%d"), ": ", e)
+                    break
+                self.put_day(day_index, date, block)
+                indexed += 1
+                date += timedelta(days=1)
+                if (args.stream):
+                    # the first date was searched for, the stream carries on from its first block
+                    indexed += self.stream_days(args, day_index, block, date, date_to)
+                    break
+            elapsed = time.time() - start
+            print("index-days: ", indexed, " dates indexed, ", day_index.count(), " dates in ", args.day_index or DEFAULT_DAY_INDEX,
+                  " (", round(elapsed, 3), "s)")
+            self.__logger.info("index-days: " + str(indexed) + " dates indexed in " + str(round(elapsed, 3)) + "s")
+        finally:
+            day_index.close()
+
+    def stream_days(self, args, day_index, block, date, date_to):
+        # every header after block in height order.  Like the search, the first block of a date is the one after the
+        # last block from before its midnight, known once MEDIAN_TIME_SPAN blocks in a row are at or past midnight
+        stream = HeaderStream(self.__calculator, args.stream_batch, args.stream_workers)
+        midnight = int(date.replace(tzinfo=timezone.utc).timestamp())
+        indexed = 0
+        # (height, time) of the headers since the last one from before midnight
+        run = []
+        headers = stream.headers(int(block) + 1)
+        try:
+            for header in headers:
+                if (header.time < midnight):
+                    run = []
+                else:
+                    run.append((header.height, header.time))
+                while (len(run) >= MEDIAN_TIME_SPAN and date <= date_to):
+                    self.put_day(day_index, date, run[0][0])
+                    indexed += 1
+                    date += timedelta(days=1)
+                    midnight += 24 * 60 * 60
+                    # the run may reach into the next date already
+                    before_midnight = [i for i, (height, time) in enumerate(run) if time < midnight]
+                    if (before_midnight):
+                        run = run[before_midnight[-1] + 1:]
+                if (date > date_to):
+                    return indexed
+        finally:
+            headers.close()
+        if (run and date <= date_to):
+            # the tip of the chain is past midnight, the search settles on the same block there
+            self.put_day(day_index, date, run[0][0])
+            indexed += 1
+            date += timedelta(days=1)
+        print("stopping at ", date.strftime("%Y-%m-%d"), ": reached the tip of the chain")
+        return indexed
+
+    def put_day(self, day_index, date, height):
+        day_index.put(date.strftime("%Y-%m-%d"), height)
+        print(date.strftime("%Y-%m-%d"), ": ", height)
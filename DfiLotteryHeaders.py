@@ -0,0 +1,70 @@
+import csv, json, sys, time
+from argparse import RawDescriptionHelpFormatter
+from datetime import datetime, timezone
+from DfiLotteryCalculator import add_block_arguments
+from HeaderStream import DEFAULT_BATCH_SIZE, DEFAULT_STREAM_WORKERS, HeaderStream
+
+HEADER_FORMATS = ["csv", "jsonl"]
+HEADER_FIELDS = ["height", "hash", "time", "minter", "prev_block"]
+
+class DfiLotteryHeaders:
+
+    def __init__(self, logger, subparsers, calculator):
+        self.__logger = logger
+        self.__calculator = calculator
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Streams a contiguous range of DFI block headers to CSV or JSON lines, for audits\n\nExample run:\npython3 ./dfi_lotto_calc.py headers -from 1598000 -to 1687000 -bs rpc -out headers.csv\n\n####### Things to note: #######\n"+ \
+        "\t1. Headers are fetched in batches of -stream_batch with -stream_workers batches in flight, and written in height order as they arrive, so a month of blocks takes constant memory.  With -bs rpc every batch is two JSON-RPC calls.\n" + \
+        "\t2. Every header has to link to the one before it, a sync that sees the chain change under it stops with an error.  Without -to it runs up to the tip of the chain.\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("headers", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
+                                help="Set verbose option for more output/logging")
+        sub_parser.add_argument("-from", dest="height_from", default=None, type=int, required=True,
+                                help="First block height to write")
+        sub_parser.add_argument("-to", dest="height_to", default=None, type=int, required=False,
+                                help="Last block height to write (default: the tip of the chain)")
+        sub_parser.add_argument("-f", "-format", dest="format", default="csv", choices=HEADER_FORMATS,
+                                help="Output format (default: csv)")
+        sub_parser.add_argument("-out", dest="out", default=None, required=False,
+                                help="File to write the headers to (default: stdout)")
+        sub_parser.add_argument("-stream_batch", dest="stream_batch", default=DEFAULT_BATCH_SIZE, type=int, required=False,
+                                help="Block headers per batch (default: "+str(DEFAULT_BATCH_SIZE)+")")
+        sub_parser.add_argument("-stream_workers", dest="stream_workers", default=DEFAULT_STREAM_WORKERS, type=int, required=False,
+                                help="Batches fetched at the same time (default: "+str(DEFAULT_STREAM_WORKERS)+")")
+        add_block_arguments(sub_parser)
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        start = time.time()
+        self.__calculator.configure(args)
+        self.__calculator.quiet = not args.verbose
+        stream = HeaderStream(self.__calculator, args.stream_batch, args.stream_workers)
+        out = sys.stdout
+        if (args.out is not None):
+            out = open(args.out, "w", newline="")
+        written = 0
+        try:
+            writer = None
+            if (args.format == "csv"):
+                writer = csv.writer(out)
+                writer.writerow(HEADER_FIELDS)
+            for header in stream.headers(args.height_from, args.height_to):
+                row = [header.height, header.block_hash(), datetime.fromtimestamp(header.time, tz=timezone.utc).isoformat(),
+                       header.minter, header.prev_block_hash()]
+                if (writer is not None):
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(dict(zip(HEADER_FIELDS, row))) + "\n")
+                written += 1
+        finally:
+            if (out is not sys.stdout):
+                out.close()
+        elapsed = time.time() - start
+        if (args.out is not None):
+            print("headers: ", written, " block headers written to ", args.out, " (", round(elapsed, 3), "s, ",
+                  round(written / elapsed) if elapsed > 0 else written, " headers/s)")
+        self.__logger.info("headers: " + str(written) + " block headers from " + str(args.height_from) + " in " + str(round(elapsed, 3)) + "s")
@@ -0,0 +1,117 @@
+import csv, json, re, sys
+from argparse import RawDescriptionHelpFormatter
+from types import SimpleNamespace
+from DfiLotteryCalculator import DEFAULT_HISTORY
+from DrawingHistory import HISTORY_FIELDS, DrawingHistory
+
+HISTORY_FORMATS = ["csv", "jsonl"]
+# the console output of calc, as kept in dfi_lotto_past_results.txt
+DRAWING_HEADER = re.compile(r"DeFiChain Community Lottery Drawing\s+(\d+)")
+TARGET_DATE = re.compile(r"target_date \(\s*(\d{4}-\d{2}-\d{2})")
+RESULT_LINE = re.compile(r"^[#!\s]*([a-z][a-z0-9_ ]*):\s+(\S+)")
+# older drawings printed some of the fields under different names
+FIELD_ALIASES = {"first_block_of_target_day": "first_block_of_target_date"}
+IMPORT_FIELDS = {"dfi_at_midnight": float, "btc_at_midnight": float, "multiply_dfi_by_btc": int, "first_block_of_target_date": int,
+                 "last_4_digits_of_block_hash": str, "last_4_digits_of_block_minter": str, "first_concat": str,
+                 "sha256_result": str, "second_concat": str, "decimal_of_second_concat": int, "decimal_result": float,
+                 "total_number_of_tickets": int, "winning_ticket": int}
+
+def parse_past_results(text):
+    # splits the log on its "DeFiChain Community Lottery Drawing N" banners and keeps the last value printed for each field,
+    # so the "using 1.0" warnings printed before the real prices do not win
+    drawings = []
+    current = None
+    for line in text.splitlines():
+        header = DRAWING_HEADER.search(line)
+        if (header):
+            current = {"drawing": int(header.group(1))}
+            drawings.append(current)
+            continue
+        if (current is None):
+            continue
+        target_date = TARGET_DATE.search(line)
+        if (target_date):
+            current["target_date"] = target_date.group(1)
+            continue
+        match = RESULT_LINE.match(line)
+        if (match is None):
+            continue
+        field = match.group(1).strip().replace(" ", "_")
+        field = FIELD_ALIASES.get(field, field)
+        if (field in IMPORT_FIELDS):
+            current[field] = IMPORT_FIELDS[field](match.group(2))
+    return drawings
+
+class DfiLotteryHistory:
+
+    def __init__(self, logger, subparsers):
+        self.__logger = logger
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Looks up past drawing results recorded by calc and calc-batch\n\nExample run:\npython3 ./dfi_lotto_calc.py history -import dfi_lotto_past_results.txt\npython3 ./dfi_lotto_calc.py history -from 2022-01-01 -to 2022-03-31\n\n####### Things to note: #######\n"+ \
+        "\t1. Every calc and calc-batch run records its result in the history store (-hs/-history), unless -nh/-no_history is given.  Re-running a drawing with the same inputs updates its row.\n" + \
+        "\t2. -import reads console output kept in a text file, like dfi_lotto_past_results.txt, and records every drawing in it.\n" + \
+        "\t3. The store is indexed by drawing number, target date and first block, so -drawing, -date, -from/-to and -block are index lookups however many drawings are recorded.  Filters are combined.\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("history", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
+                                help="Set verbose option for more output/logging")
+        sub_parser.add_argument("-import", dest="import_file", default=None, required=False,
+                                help="Text file of calc console output to import (ex: dfi_lotto_past_results.txt)")
+        sub_parser.add_argument("-drawing", dest="drawing", default=None, type=int, required=False,
+                                help="Only show this drawing number")
+        sub_parser.add_argument("-date", dest="target_date", default=None, required=False,
+                                help="Only show drawings for this target date (ex: 2022-02-05)")
+        sub_parser.add_argument("-from", dest="date_from", default=None, required=False,
+                                help="Only show drawings on or after this target date")
+        sub_parser.add_argument("-to", dest="date_to", default=None, required=False,
+                                help="Only show drawings on or before this target date")
+        sub_parser.add_argument("-block", dest="block", default=None, type=int, required=False,
+                                help="Only show drawings that used this first block of the day")
+        sub_parser.add_argument("-winner", dest="winning_ticket", default=None, type=int, required=False,
+                                help="Only show drawings won by this ticket")
+        sub_parser.add_argument("-f", "-format", dest="format", default="csv", choices=HISTORY_FORMATS,
+                                help="Output format (default: csv)")
+        sub_parser.add_argument("-hs", "-history", dest="history", default=None, required=False,
+                                help="SQLite file drawing results are recorded in (default: "+DEFAULT_HISTORY+")")
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        history = DrawingHistory(args.history or DEFAULT_HISTORY)
+        try:
+            if (args.import_file is not None):
+                self.import_past_results(history, args.import_file, args.verbose)
+                if (args.drawing is None and args.target_date is None and args.date_from is None and args.date_to is None
+                        and args.block is None and args.winning_ticket is None):
+                    return
+            rows = history.find(drawing=args.drawing, target_date=args.target_date, date_from=args.date_from,
+                                date_to=args.date_to, block=args.block, winning_ticket=args.winning_ticket)
+        finally:
+            history.close()
+        if (args.format == "csv"):
+            writer = csv.DictWriter(sys.stdout, fieldnames=HISTORY_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                sys.stdout.write(json.dumps(row) + "\n")
+        self.__logger.info("history: " + str(len(rows)) + " drawings found")
+
+    def import_past_results(self, history, import_file, verbose=False):
+        with open(import_file) as f:
+            drawings = parse_past_results(f.read())
+        imported = 0
+        for drawing in drawings:
+            missing = [field for field in ["target_date", "first_block_of_target_date", "first_concat", "total_number_of_tickets", "winning_ticket"]
+                       if field not in drawing]
+            if (missing):
+                print("WARNING!  Skipping drawing ", drawing["drawing"], ", missing ", ", ".join(missing))
+                continue
+            history.put(SimpleNamespace(**drawing), drawing["target_date"], drawing["drawing"], source="import")
+            imported += 1
+            if (verbose):
+                print("#### Imported drawing ", drawing["drawing"], " (", drawing["target_date"], "): winning_ticket ", drawing["winning_ticket"])
+        print("imported ", imported, " of ", len(drawings), " drawings from ", import_file)
+        self.__logger.info("history: imported " + str(imported) + " of " + str(len(drawings)) + " drawings from " + import_file)
@@ -0,0 +1,222 @@
+import json, threading, time
+from argparse import RawDescriptionHelpFormatter
+from datetime import datetime, timedelta, timezone
+from ChainDayIndex import ChainDayIndex
+from DfiBlockSource import BlockNotFound
+from DfiDrawingEngine import DrawingInputs
+from DfiLotteryCalculator import DEFAULT_DAY_INDEX, MIDNIGHT_CANDLE_MS, add_shared_arguments
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8555
+DEFAULT_POLL_SECONDS = 10
+# KuCoin needs a moment after a candle closes before it serves the final values
+CANDLE_SETTLE_SECONDS = 2
+CANDLE_RETRY_SECONDS = 2
+# one cheap exchange call shortly before midnight, so the candle requests reuse an open connection
+WARM_SECONDS_BEFORE_MIDNIGHT = 120
+
+class DfiLotteryServer:
+
+    def __init__(self, logger, subparsers, calculator):
+        self.__logger = logger
+        self.__calculator = calculator
+        self.__lock = threading.Lock()
+        self.__drawings = {}
+        self.__latest = None
+        self.__status = {}
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Runs as a daemon that publishes every drawing as soon as its midnight candles and first block exist\n\nExample run:\npython3 ./dfi_lotto_calc.py serve -t 60 -b 1598835 -port 8555\ncurl http://127.0.0.1:8555/drawing?tickets=60\n\n####### Things to note: #######\n"+ \
+        "\t1. serve keeps one block source HTTP pool and one client per exchange (-exchanges) open for its whole life and follows the tip of the chain every -poll seconds, starting from -b (default: the last block in the day index).\n" + \
+        "\t2. Once the first block after 00:00 UTC is on chain and the 5 minute candles that start at midnight have closed, the drawing inputs are published, normally a few seconds after 00:05 UTC.  With -t the winning ticket is computed and recorded in the history store as well.  -d starts with an earlier date, which is published right away.\n" + \
+        "\t3. GET /drawing returns the latest published drawing as JSON, ?date=YYYY-MM-DD picks an earlier one and ?tickets=N computes the winning ticket for N tickets.  GET /status shows the chain head and what the pending drawing still waits for.\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("serve", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-t", "-total_tickets", dest="total_tickets", default=None, type=int, required=False,
+                                help="Total # of lottery tickets, to compute and record the winning ticket of every drawing")
+        sub_parser.add_argument("-d", "-target_date", dest="target_date", default=None, required=False,
+                                help="First date to publish (default: today, UTC)")
+        sub_parser.add_argument("-b", "-block_id", dest="block_id", default=None, required=False,
+                                help="Block ID to start following the chain from (default: the last block in the day index)")
+        sub_parser.add_argument("-host", dest="host", default=DEFAULT_HOST, required=False,
+                                help="Address the JSON endpoint listens on (default: "+DEFAULT_HOST+")")
+        sub_parser.add_argument("-port", dest="port", default=DEFAULT_PORT, type=int, required=False,
+                                help="Port the JSON endpoint listens on (default: "+str(DEFAULT_PORT)+")")
+        sub_parser.add_argument("-poll", dest="poll", default=DEFAULT_POLL_SECONDS, type=float, required=False,
+                                help="Seconds between looks at the tip of the chain (default: "+str(DEFAULT_POLL_SECONDS)+")")
+        add_shared_arguments(sub_parser)
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        self.__calculator.configure(args)
+        self.__calculator.quiet = not args.verbose
+        self.__day_index = None if args.no_cache or args.replay is not None else ChainDayIndex(args.day_index or DEFAULT_DAY_INDEX)
+        self.__head = self.find_start_block(args)
+        self.__target_date = self.parse_target_date(args.target_date)
+        self.__pending = {}
+        self.__warmed = None
+        self.__status = {"started": self.now().isoformat(timespec="seconds"), "polls": 0, "last_error": None}
+
+        # the exchange clients are created (and their markets loaded) now, not at midnight
+        self.__calculator.prices.connect()
+
+        # the endpoint's modules are only loaded by serve, not on every start of the CLI
+        from DrawingEndpoint import DrawingHTTPServer, DrawingRequestHandler
+        http_server = DrawingHTTPServer((args.host, args.port), DrawingRequestHandler)
+        http_server.drawings = self
+        threading.Thread(target=http_server.serve_forever, name="serve-http", daemon=True).start()
+        print("serving drawings on http://" + args.host + ":" + str(args.port) + "/drawing, following the chain from block #", self.__head[0])
+        self.__logger.info("serve: listening on " + args.host + ":" + str(args.port) + ", head " + str(self.__head[0]))
+        try:
+            while (True):
+                time.sleep(self.poll(args))
+        finally:
+            http_server.shutdown()
+            http_server.server_close()
+            if (self.__day_index is not None):
+                self.__day_index.close()
+
+    def now(self):
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def parse_target_date(self, target_date):
+        if (target_date is None):
+            today = self.now()
+            return datetime(today.year, today.month, today.day)
+        from dateutil.parser import parse
+        target_date = parse(target_date)
+        return datetime(target_date.year, target_date.month, target_date.day)
+
+    def find_start_block(self, args):
+        block = args.block_id
+        if (block is None and self.__day_index is not None and self.__day_index.last() is not None):
+            block = self.__day_index.last()[1]
+        if (block is None):
+            raise ValueError("serve needs a block to start following the chain from, pass one with -b or run index-days first")
+        return self.__calculator.get_block_height_and_time(block)
+
+    def poll(self, args):
+        # one look at the chain and the exchange, returns the number of seconds to sleep before the next one
+        try:
+            self.__head = self.follow_tip(self.__head)
+            self.advance_drawing(args)
+            self.__status["last_error"] = None
+        except ValueError as e:
+            self.record_error(e)
+        except Exception as e:
+            # a daemon outlives network hiccups, the next poll simply tries again
+            self.record_error(repr(e))
+        self.__status["polls"] += 1
+        self.__calculator.tracer.write_metrics()
+        return self.seconds_until_next_poll(args)
+
+    def record_error(self, error):
+        print("WARNING! ", error)
+        self.__logger.error("serve: " + str(error))
+        self.__status["last_error"] = str(error)
+
+    def follow_tip(self, head):
+        # gallop forward from the last known (height, time) head until the block source has nothing newer, then
+        # bisect between the last block found and the first one missing.  A poll that finds one new block costs two
+        # lookups and catching up after a restart only a logarithmic number
+        step = 1
+        beyond_tip = None
+        while (beyond_tip is None or beyond_tip - head[0] > 1):
+            height = head[0] + step if beyond_tip is None else (head[0] + beyond_tip) // 2
+            try:
+                head = self.__calculator.get_block_height_and_time(height)
+                step *= 2
+            except BlockNotFound:
+                beyond_tip = height
+        return head
+
+    def advance_drawing(self, args):
+        target_date = self.__target_date
+        midnight = self.__target_date
+        pending = self.__pending
+        if (self.now() < midnight):
+            if (self.__warmed != target_date and self.now() >= midnight - timedelta(seconds=WARM_SECONDS_BEFORE_MIDNIGHT)):
+                self.__calculator.prices.warm(self.__calculator.get_symbols()[1])
+                self.__warmed = target_date
+            return
+
+        if ("first_block" not in pending and self.__head[1] >= midnight):
+            first_block = None
+            if (self.__day_index is not None):
+                first_block = self.__day_index.get(target_date.strftime("%Y-%m-%d"))
+            if (first_block is None):
+                # the head is already past midnight, so the search walks back a few blocks at most
+                first_block = self.__calculator.find_first_block_of_date(self.__head[0], target_date)
+                if (self.__day_index is not None):
+                    self.__day_index.put(target_date.strftime("%Y-%m-%d"), first_block)
+            pending["first_block"] = first_block
+            pending["header"] = self.__calculator.get_block_hash_timestamp_minter(first_block)
+            print(target_date.strftime("%Y-%m-%d"), " first_block_of_target_day: ", first_block)
+
+        if ("prices" not in pending and self.now() >= midnight + timedelta(milliseconds=MIDNIGHT_CANDLE_MS, seconds=CANDLE_SETTLE_SECONDS)):
+            dfi_at_midnight, btc_at_midnight = self.__calculator.fetch_midnight_prices(target_date)
+            if (dfi_at_midnight and btc_at_midnight):
+                pending["prices"] = (float(dfi_at_midnight), float(btc_at_midnight))
+                pending["price_source"] = self.__calculator.get_price_source(target_date)
+                print(target_date.strftime("%Y-%m-%d"), " dfi_at_midnight: ", dfi_at_midnight, "  btc_at_midnight: ", btc_at_midnight,
+                      "  price_source: ", pending["price_source"])
+
+        if ("first_block" in pending and "prices" in pending):
+            self.publish(args, target_date, pending)
+            self.__target_date = target_date + timedelta(days=1)
+            self.__pending = {}
+
+    def publish(self, args, target_date, pending):
+        header = pending["header"]
+        published_at = self.now()
+        drawing = {"target_date": target_date.strftime("%Y-%m-%d"), "dfi_at_midnight": pending["prices"][0],
+                   "btc_at_midnight": pending["prices"][1], "price_source": pending["price_source"],
+                   "first_block_of_target_date": pending["first_block"],
+                   "block_hash": header.hash, "minter": header.minter, "block_time": header.timestamp,
+                   "published_at": published_at.isoformat(timespec="seconds") + "Z",
+                   "seconds_after_midnight": round((published_at - target_date).total_seconds(), 1)}
+        if (args.total_tickets is not None):
+            result = self.__calculator.compute_drawing(self.drawing_inputs(drawing, args.total_tickets))
+            drawing.update(result._asdict())
+            self.__calculator.record_result(result, target_date, source="serve", price_source=drawing["price_source"])
+            print(drawing["target_date"], " winning_ticket: ", result.winning_ticket)
+        # readers without a query get these bytes as they are, nothing is encoded per request
+        body = json.dumps(drawing, sort_keys=True).encode("utf-8")
+        with self.__lock:
+            self.__drawings[drawing["target_date"]] = (drawing, body)
+            self.__latest = drawing["target_date"]
+        print(drawing["target_date"], " published ", drawing["seconds_after_midnight"], "s after midnight")
+        self.__logger.info("serve: published " + body.decode("utf-8"))
+
+    def drawing_inputs(self, drawing, total_number_of_tickets):
+        return DrawingInputs(drawing["dfi_at_midnight"], drawing["btc_at_midnight"], drawing["first_block_of_target_date"],
+                             drawing["block_hash"], drawing["minter"], int(total_number_of_tickets))
+
+    def seconds_until_next_poll(self, args):
+        wait = args.poll
+        now = self.now()
+        midnight = self.__target_date
+        candle_close = midnight + timedelta(milliseconds=MIDNIGHT_CANDLE_MS, seconds=CANDLE_SETTLE_SECONDS)
+        if (now < midnight - timedelta(seconds=WARM_SECONDS_BEFORE_MIDNIGHT) and self.__warmed != midnight):
+            wait = min(wait, (midnight - timedelta(seconds=WARM_SECONDS_BEFORE_MIDNIGHT) - now).total_seconds())
+        elif (now < midnight):
+            wait = min(wait, (midnight - now).total_seconds())
+        elif ("prices" not in self.__pending and now < candle_close):
+            wait = min(wait, (candle_close - now).total_seconds())
+        elif ("prices" not in self.__pending):
+            wait = min(wait, CANDLE_RETRY_SECONDS)
+        return max(wait, 0.1)
+
+    def get_drawing(self, target_date=None):
+        # (drawing, encoded body) of target_date or of the latest published date, None before anything is published
+        with self.__lock:
+            return self.__drawings.get(target_date or self.__latest)
+
+    def get_status(self):
+        status = dict(self.__status)
+        status.update({"head": self.__head[0], "head_time": self.__head[1].isoformat(), "pending_date": self.__target_date.strftime("%Y-%m-%d"),
+                       "pending_first_block": self.__pending.get("first_block"), "pending_prices": self.__pending.get("prices"),
+                       "latest": self.__latest})
+        return status
@@ -0,0 +1,151 @@
+import csv, math, os, random, string, time
+from argparse import RawDescriptionHelpFormatter
+from DfiDrawingEngine import SECOND_CONCAT_SCALE, build_first_concat, second_concat_value
+
+DEFAULT_SAMPLES = 1000000
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_TICKET_TOTALS = "10,55,100,1000"
+# synthetic inputs are drawn from ranges that look like real drawings
+MULTIPLY_DFI_BY_BTC_RANGE = (10000, 500000)
+BLOCK_HEIGHT_RANGE = (1000000, 5000000)
+# DFI addresses are base58, so that is what the last 4 characters of a minter look like
+BASE58_DIGITS = "".join(c for c in string.digits + string.ascii_letters if c not in "0OIl")
+
+class DfiLotterySimulator:
+
+    def __init__(self, logger, subparsers):
+        self.__logger = logger
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Measures how fair the winning ticket formula is by drawing many synthetic lotteries\n\nExample run:\npython3 ./dfi_lotto_calc.py simulate -n 10000000 -t 10,55,1000 -j 8 -out fairness.csv\n\n####### Things to note: #######\n"+ \
+        "\t1. Every sample is a random first_concat (multiply_dfi_by_btc, block, last 4 of a hash, last 4 of a minter) put through the same SHA-256 and rounding steps as calc, then drawn for each ticket total given with -t.\n" + \
+        "\t2. round(decimal_result * total_number_of_tickets) can return ticket 0, which does not exist, and ticket total_number_of_tickets only half as often as the others.  Both are reported as edge bias.\n" + \
+        "\t3. Two chi-square tests are printed: 'fair' compares tickets 1..total_number_of_tickets against a uniform draw (ticket 0 left out), 'rounding' compares tickets 0..total_number_of_tickets against what the rounding should give (1/(2N) for 0 and N, 1/N for the rest).  p-values use the Wilson-Hilferty approximation.\n" + \
+        "\t4. Samples are split into chunks of -chunk samples, each seeded from -seed and its chunk number, and spread over -j processes.  Results only depend on -seed, -n and -chunk, not on -j.\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("simulate", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
+                                help="Set verbose option for more output/logging")
+        sub_parser.add_argument("-n", "-samples", dest="samples", default=DEFAULT_SAMPLES, type=int, required=False,
+                                help="Number of synthetic drawings (default: "+str(DEFAULT_SAMPLES)+")")
+        sub_parser.add_argument("-t", "-total_tickets", dest="total_tickets", default=DEFAULT_TICKET_TOTALS, required=False,
+                                help="Ticket totals to draw for, a comma separated list or START:STOP (default: "+DEFAULT_TICKET_TOTALS+")")
+        sub_parser.add_argument("-j", "-jobs", dest="jobs", default=os.cpu_count() or 1, type=int, required=False,
+                                help="Number of worker processes (default: number of CPUs)")
+        sub_parser.add_argument("-chunk", dest="chunk", default=DEFAULT_CHUNK_SIZE, type=int, required=False,
+                                help="Samples per work unit (default: "+str(DEFAULT_CHUNK_SIZE)+")")
+        sub_parser.add_argument("-seed", dest="seed", default=0, type=int, required=False,
+                                help="Random seed (default: 0)")
+        sub_parser.add_argument("-out", dest="out", default=None, required=False,
+                                help="CSV file for the per ticket frequencies (total_number_of_tickets, ticket, hits, share, fair_share, rounding_share)")
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        ticket_totals = parse_ticket_totals(args.total_tickets)
+        if (args.samples <= 0 or args.chunk <= 0):
+            raise ValueError("-n and -chunk must be positive")
+        start = time.time()
+        tasks = [(args.seed, chunk, min(args.chunk, args.samples - chunk * args.chunk), ticket_totals)
+                 for chunk in range((args.samples + args.chunk - 1) // args.chunk)]
+        counts = [[0] * (total_number_of_tickets + 1) for total_number_of_tickets in ticket_totals]
+        jobs = max(min(args.jobs, len(tasks)), 1)
+        if (jobs == 1):
+            self.merge_counts(counts, map(simulate_chunk, tasks))
+        else:
+            from multiprocessing import Pool
+            with Pool(processes=jobs) as pool:
+                self.merge_counts(counts, pool.imap_unordered(simulate_chunk, tasks))
+        elapsed = time.time() - start
+
+        print("samples: ", args.samples, " chunks: ", len(tasks), " processes: ", jobs, " time: ", round(elapsed, 3),
+              "s (", int(args.samples / elapsed) if elapsed > 0 else args.samples, " samples/s)")
+        for total_number_of_tickets, hits in zip(ticket_totals, counts):
+            self.report(total_number_of_tickets, hits, args.samples, args.verbose)
+        if (args.out is not None):
+            with open(args.out, "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(["total_number_of_tickets", "ticket", "hits", "share", "fair_share", "rounding_share"])
+                for total_number_of_tickets, hits in zip(ticket_totals, counts):
+                    for ticket, ticket_hits in enumerate(hits):
+                        writer.writerow([total_number_of_tickets, ticket, ticket_hits, ticket_hits / args.samples,
+                                         fair_share(ticket, total_number_of_tickets), rounding_share(ticket, total_number_of_tickets)])
+            print("frequencies written to ", args.out)
+        self.__logger.info("simulate: " + str(args.samples) + " samples for ticket totals " + str(ticket_totals) +
+                           " in " + str(round(elapsed, 3)) + "s on " + str(jobs) + " processes")
+
+    def merge_counts(self, counts, results):
+        for chunk_counts in results:
+            for total_counts, chunk_total_counts in zip(counts, chunk_counts):
+                for ticket, hits in enumerate(chunk_total_counts):
+                    total_counts[ticket] += hits
+
+    def report(self, total_number_of_tickets, hits, samples, verbose):
+        n = total_number_of_tickets
+        valid = samples - hits[0]
+        fair_chi2 = sum((hits[ticket] - valid / n) ** 2 / (valid / n) for ticket in range(1, n + 1)) if valid else 0.0
+        rounding_chi2 = sum((hits[ticket] - samples * rounding_share(ticket, n)) ** 2 / (samples * rounding_share(ticket, n))
+                            for ticket in range(n + 1))
+        interior = hits[2:n] if n > 2 else hits[1:n + 1]
+        interior_share = sum(interior) / len(interior) / samples if interior else 0.0
+        print("")
+        print("############# total_number_of_tickets: ", n, " #############")
+        print("ticket 0 (does not exist): ", hits[0], " hits, share ", format_share(hits[0] / samples), " expected ", format_share(rounding_share(0, n)))
+        print("ticket 1: share ", format_share(hits[1] / samples), " ticket ", n, ": share ", format_share(hits[n] / samples),
+              " interior tickets: mean share ", format_share(interior_share), " fair share ", format_share(1 / n))
+        if (interior_share > 0):
+            print("edge bias: ticket 1 wins ", round(hits[1] / samples / interior_share, 4), "x and ticket ", n, " wins ",
+                  round(hits[n] / samples / interior_share, 4), "x as often as an interior ticket")
+        print("chi-square fair (tickets 1..", n, "): ", round(fair_chi2, 3), " df ", n - 1, " p ", format_p(chi2_p_value(fair_chi2, n - 1)))
+        print("chi-square rounding (tickets 0..", n, "): ", round(rounding_chi2, 3), " df ", n, " p ", format_p(chi2_p_value(rounding_chi2, n)))
+        if (verbose):
+            for ticket, ticket_hits in enumerate(hits):
+                print("#### ticket ", ticket, ": ", ticket_hits, " hits, share ", format_share(ticket_hits / samples))
+
+def simulate_chunk(task):
+    # runs in a worker process: draws one chunk of synthetic first_concat strings and counts the winning tickets
+    seed, chunk, size, ticket_totals = task
+    rng = random.Random("{}:{}".format(seed, chunk))
+    counts = [[0] * (total_number_of_tickets + 1) for total_number_of_tickets in ticket_totals]
+    draws = list(zip(ticket_totals, counts))
+    for _ in range(size):
+        first_concat = build_first_concat(rng.randint(*MULTIPLY_DFI_BY_BTC_RANGE), rng.randint(*BLOCK_HEIGHT_RANGE),
+                                          "{:04x}".format(rng.getrandbits(16)), "".join(rng.choices(BASE58_DIGITS, k=4)))
+        decimal_result = second_concat_value(first_concat) / SECOND_CONCAT_SCALE
+        for total_number_of_tickets, total_counts in draws:
+            total_counts[round(decimal_result * total_number_of_tickets)] += 1
+    return counts
+
+def parse_ticket_totals(spec):
+    spec = str(spec).strip()
+    if (":" in spec):
+        start, stop = spec.split(":", 1)
+        totals = list(range(int(start), int(stop) + 1))
+    else:
+        totals = [int(value) for value in spec.split(",") if value.strip()]
+    if (not totals or min(totals) <= 0):
+        raise ValueError("ticket totals must be positive, got " + spec)
+    return totals
+
+def fair_share(ticket, total_number_of_tickets):
+    return 1 / total_number_of_tickets if 1 <= ticket <= total_number_of_tickets else 0.0
+
+def rounding_share(ticket, total_number_of_tickets):
+    # decimal_result is uniform on [0, 1), so round() gives 0 and N half a ticket wide each
+    if (ticket == 0 or ticket == total_number_of_tickets):
+        return 1 / (2 * total_number_of_tickets)
+    return 1 / total_number_of_tickets
+
+def chi2_p_value(chi2, df):
+    # Wilson-Hilferty: (chi2/df)^(1/3) is close to normal, good enough to flag a bias without scipy
+    if (df <= 0):
+        return 1.0
+    z = ((chi2 / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def format_share(share):
+    return "{:.4%}".format(share)
+
+def format_p(p):
+    return "{:.3g}".format(p)
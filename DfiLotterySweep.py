@@ -0,0 +1,129 @@
+import csv, time
+from argparse import RawDescriptionHelpFormatter
+from DfiDrawingEngine import SECOND_CONCAT_SCALE, second_concat_value
+from DfiLotteryCalculator import add_block_arguments
+
+DEFAULT_TOP = 5
+
+class DfiLotterySweep:
+
+    def __init__(self, logger, subparsers, calculator):
+        self.__logger = logger
+        self.__calculator = calculator
+        self.__build_menu(subparsers)
+
+    def __build_menu(self, subparsers):
+        desc = "Shows how the winning ticket moves over ranges of prices, ticket totals and first blocks\n\nExample run:\npython3 ./dfi_lotto_calc.py sweep -dfi 2.780:2.800:0.001 -btc 41500:41700:0.1 -t 55:65 -b 1598835 -out sweep.csv\n\n####### Things to note: #######\n"+ \
+        "\t1. Ranges are START:STOP:STEP (STOP included), START:STOP for whole numbers, a comma separated list or a single value.\n" + \
+        "\t2. Many price pairs round to the same multiply_dfi_by_btc, so each distinct product is hashed only once per block and weighted by how many pairs produce it.  The ticket math runs on NumPy arrays (pip install numpy).\n" + \
+        "\t3. -b blocks are used as the first block of the day as given, their hash and minter come from the block source / block cache.\n" + \
+            "###############################"
+        sub_parser = subparsers.add_parser("sweep", description=desc,
+                                           formatter_class=RawDescriptionHelpFormatter)
+        sub_parser.add_argument("-v", "-verbose", dest="verbose", action='store_true', required=False,
+                                help="Set verbose option for more output/logging")
+        sub_parser.add_argument("-dfi", "-dfi_price", dest="dfi_price", default=None, required=True,
+                                help="DFI/USDT prices to try (ex: 2.780:2.800:0.001)")
+        sub_parser.add_argument("-btc", "-btc_price", dest="btc_price", default=None, required=True,
+                                help="BTC/USDT prices to try (ex: 41500:41700:0.1)")
+        sub_parser.add_argument("-t", "-total_tickets", dest="total_tickets", default=None, required=True,
+                                help="Ticket totals to try (ex: 55:65)")
+        sub_parser.add_argument("-b", "-first_blocks", dest="first_blocks", default=None, required=True,
+                                help="Candidate first blocks of the day (ex: 1598834:1598836)")
+        sub_parser.add_argument("-top", dest="top", default=DEFAULT_TOP, type=int, required=False,
+                                help="Number of most likely winning tickets to print per ticket total (default: "+str(DEFAULT_TOP)+")")
+        sub_parser.add_argument("-out", dest="out", default=None, required=False,
+                                help="CSV file for the full histogram (total_number_of_tickets, winning_ticket, combinations, share)")
+        add_block_arguments(sub_parser)
+        sub_parser.set_defaults(func=self.__main)
+
+    def __main(self, args):
+        np = import_numpy()
+        start = time.time()
+        dfi_prices = parse_range(np, args.dfi_price)
+        btc_prices = parse_range(np, args.btc_price)
+        ticket_totals = parse_range(np, args.total_tickets, integer=True)
+        first_blocks = parse_range(np, args.first_blocks, integer=True)
+        if (ticket_totals.min() <= 0):
+            raise ValueError("ticket totals must be positive")
+
+        self.__calculator.configure(args)
+        self.__calculator.quiet = True
+        headers = [self.__calculator.get_block_hash_timestamp_minter(int(block)) for block in first_blocks]
+
+        # same rounding as multiply_prices: np.rint and round() both round half to even
+        products, weights = np.unique(np.rint(np.multiply.outer(btc_prices, dfi_prices)).astype(np.int64), return_counts=True)
+        decimal_results = self.hash_grid(np, products, headers)
+        weights = np.tile(weights, len(headers))
+        combinations = int(weights.sum()) * len(ticket_totals)
+        hash_time = time.time() - start
+
+        print("dfi prices: ", len(dfi_prices), " btc prices: ", len(btc_prices), " distinct multiply_dfi_by_btc: ", len(products),
+              " first blocks: ", len(headers), " ticket totals: ", len(ticket_totals))
+        writer = None
+        out = None
+        if (args.out is not None):
+            out = open(args.out, "w", newline="")
+            writer = csv.writer(out)
+            writer.writerow(["total_number_of_tickets", "winning_ticket", "combinations", "share"])
+        try:
+            for total_number_of_tickets in ticket_totals.tolist():
+                winning_tickets = np.rint(decimal_results * total_number_of_tickets).astype(np.int64)
+                histogram = np.rint(np.bincount(winning_tickets, weights=weights, minlength=total_number_of_tickets + 1)).astype(np.int64)
+                total = int(histogram.sum())
+                most_likely = np.argsort(histogram, kind="stable")[::-1][:max(args.top, 0)]
+                print("total_number_of_tickets: ", total_number_of_tickets, " distinct winning tickets: ", int(np.count_nonzero(histogram)),
+                      " most likely: ", ", ".join("{} ({:.2%})".format(int(ticket), histogram[ticket] / total) for ticket in most_likely if histogram[ticket]))
+                if (writer is not None):
+                    for ticket in np.nonzero(histogram)[0].tolist():
+                        writer.writerow([total_number_of_tickets, ticket, int(histogram[ticket]), histogram[ticket] / total])
+        finally:
+            if (out is not None):
+                out.close()
+        elapsed = time.time() - start
+        print("combinations: ", combinations, " hashes: ", len(decimal_results), " hashing: ", round(hash_time, 3), "s total: ", round(elapsed, 3),
+              "s (", int(combinations / elapsed) if elapsed > 0 else combinations, " combinations/s)")
+        self.__logger.info("sweep: " + str(combinations) + " combinations in " + str(round(elapsed, 3)) + "s")
+
+    def hash_grid(self, np, products, headers):
+        # first_concat is "{multiply_dfi_by_btc}{block}{hash[-4:]}{minter[-4:]}", so the block part is built once per block
+        decimal_results = []
+        for header in headers:
+            suffix = "{}{}{}".format(header.height, header.hash[-4:], header.minter[-4:])
+            decimal_results.append(np.fromiter((second_concat_value(str(product) + suffix) for product in products.tolist()),
+                                               dtype=np.int64, count=len(products)))
+        # values are below 16^10, so int64 -> float64 and the division by a power of two are exact, same as the engine
+        return np.concatenate(decimal_results).astype(np.float64) / SECOND_CONCAT_SCALE
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError("this command needs NumPy, install it with: pip install numpy")
+    return numpy
+
+def parse_range(np, spec, integer=False):
+    # START:STOP:STEP with STOP included, START:STOP (step 1), a comma separated list or a single value
+    spec = str(spec).strip()
+    if (":" in spec):
+        parts = spec.split(":")
+        if (len(parts) == 2):
+            parts.append("1")
+        if (len(parts) != 3):
+            raise ValueError("bad range " + spec + ", expected START:STOP:STEP")
+        start, stop, step = [float(part) for part in parts]
+        if (step <= 0 or stop < start):
+            raise ValueError("bad range " + spec + ", STOP must not be below START and STEP must be positive")
+        values = start + step * np.arange(int(round((stop - start) / step)) + 1)
+        # keep the decimals the user typed, so 2.78 + 0.001 * 3 is 2.783 and not 2.7830000000000004
+        values = np.round(values, max(count_decimals(part) for part in parts))
+    else:
+        values = np.array([float(value) for value in spec.split(",") if value.strip()])
+    if (integer):
+        return values.astype(np.int64)
+    return values
+
+def count_decimals(number):
+    if ("." not in number):
+        return 0
+    return len(number.split(".")[1])
@@ -0,0 +1,294 @@
+import json, threading, time
+from collections import namedtuple
+
+PRICE_POLICIES = ["primary", "median"]
+DEFAULT_PRICE_POLICY = "primary"
+DEFAULT_EXCHANGES = "kucoin"
+# seconds every exchange gets to answer, a slower one is left out of the drawing instead of holding it up
+DEFAULT_EXCHANGE_TIMEOUT = 10.0
+# an exchange that failed is not asked again for this long, so a batch does not wait for a venue that is down on every row
+EXCHANGE_RETRY_SECONDS = 60
+# exchange ids with this prefix are served from the -fake_prices file, so offline runs and tests need no venue
+FAKE_EXCHANGE_PREFIX = "fake"
+
+# candles come as ccxt has them: [timestamp, open, high, low, close, volume].  Every drawing so far has used
+# candle[2], the high, as "the price at midnight", so it stays the drawing price and past drawings can be re-checked
+DRAWING_PRICE_INDEX = 2
+CANDLE_CLOSE_INDEX = 4
+
+# price is what the drawing uses, source the exchange it came from (or "median(a,b,c)" of the exchanges that answered)
+PriceQuote = namedtuple("PriceQuote", ["price", "source"])
+
+def parse_exchanges(exchanges):
+    # "kucoin, binance" -> ["kucoin", "binance"], the order is the priority order of the primary policy
+    exchange_ids = []
+    for exchange_id in str(exchanges).split(","):
+        exchange_id = exchange_id.strip().lower()
+        if (exchange_id and exchange_id not in exchange_ids):
+            exchange_ids.append(exchange_id)
+    return exchange_ids
+
+class FakeExchange:
+
+    # stands in for a ccxt exchange with the candles of one entry of a -fake_prices file:
+    # {"fake": {"candles": {"DFI/USDT": [[timestamp, open, high, low, close, volume], ...]}, "delay": 0, "down": false}}
+    # in ccxt order, so the drawing price goes in the DRAWING_PRICE_INDEX column and the ticker reports the close.
+    # delay makes every call that many seconds slow and down makes every call fail, to try out a venue that is in trouble.
+    # Like a ccxt client, a call that would take longer than timeout seconds fails once they are over.
+    def __init__(self, exchange_id, candles, delay=0, down=False, timeout=None):
+        self.exchange_id = exchange_id
+        self.candles = {symbol: sorted(rows) for symbol, rows in candles.items()}
+        self.delay = delay
+        self.down = down
+        self.timeout = timeout
+
+    @classmethod
+    def from_file(cls, path, exchange_id, timeout=None):
+        if (path is None):
+            raise ValueError("exchange '" + exchange_id + "' needs a -fake_prices file")
+        with open(path) as f:
+            venues = json.load(f)
+        if (exchange_id not in venues):
+            raise ValueError("exchange '" + exchange_id + "' is not in " + path)
+        venue = venues[exchange_id]
+        return cls(exchange_id, venue.get("candles", {}), venue.get("delay", 0), venue.get("down", False), timeout)
+
+    def get_delay(self):
+        if (self.timeout is not None and self.delay > self.timeout):
+            return self.timeout
+        return self.delay
+
+    def check(self):
+        if (self.down):
+            raise ConnectionError(self.exchange_id + " is down")
+        if (self.get_delay() < self.delay):
+            raise TimeoutError(self.exchange_id + " timed out after " + str(self.timeout) + "s")
+
+    def load_markets(self):
+        time.sleep(self.get_delay())
+        self.check()
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        time.sleep(self.get_delay())
+        self.check()
+        return self.page(symbol, since, limit)
+
+    def fetch_ticker(self, symbol):
+        time.sleep(self.get_delay())
+        self.check()
+        return self.ticker(symbol)
+
+    def page(self, symbol, since, limit):
+        rows = [candle for candle in self.candles.get(symbol, []) if since is None or candle[0] >= since]
+        return rows if limit is None else rows[:limit]
+
+    def ticker(self, symbol):
+        rows = self.candles.get(symbol)
+        return {"symbol": symbol, "last": rows[-1][CANDLE_CLOSE_INDEX] if rows else None}
+
+class FetchStart:
+
+    # set on the pool thread once a call to an exchange has its turn, the exchange timeout counts from then so the
+    # time spent queued behind earlier calls to the same exchange does not make a healthy venue look slow
+    def __init__(self):
+        self.event = threading.Event()
+        self.time = None
+
+    def mark(self):
+        if (not self.event.is_set()):
+            self.time = time.time()
+            self.event.set()
+
+    def wait_until(self, timeout):
+        # the time the call runs out of its timeout seconds, waiting as long as it is queued
+        self.event.wait()
+        return self.time + timeout
+
+class DfiPriceSource:
+
+    # the midnight price of a symbol from one or more exchanges.  Every exchange that is needed is asked at the same
+    # time and gets timeout seconds to answer, then policy picks the price: primary takes the first exchange in
+    # priority order that has the candle (the later ones are fallbacks), median the median of all that answered.
+    # Fetched candles are kept per exchange and the decided quote per (symbol, timestamp) in the price store, so
+    # re-running a drawing gives the price that was decided the first time even if a venue has changed its mind since.
+    def __init__(self, calculator, price_store, timeframe, exchanges, policy=DEFAULT_PRICE_POLICY, timeout=DEFAULT_EXCHANGE_TIMEOUT):
+        if (not exchanges):
+            raise ValueError("at least one exchange is needed to fetch prices from")
+        if (policy not in PRICE_POLICIES):
+            raise ValueError("unknown price policy '" + str(policy) + "', use one of: " + ", ".join(PRICE_POLICIES))
+        self.calculator = calculator
+        self.price_store = price_store
+        self.timeframe = timeframe
+        self.exchanges = exchanges
+        self.policy = policy
+        self.timeout = timeout
+        self.__lock = threading.Lock()
+        # ccxt clients are not safe to share between threads, calls to one exchange take turns
+        self.__exchange_locks = {exchange_id: threading.Lock() for exchange_id in exchanges}
+        self.__pool = None
+        self.__failed_until = {}
+        # the source of the latest quote of every (symbol, timestamp), recorded with the drawing
+        self.__sources = {}
+
+    def get_quote_key(self):
+        # a quote is only reused by runs that would have decided it the same way
+        return self.policy + ":" + ",".join(self.calculator.get_exchange_id(exchange_id) for exchange_id in self.exchanges)
+
+    def get_source(self, symbol, timestamp):
+        with self.__lock:
+            return self.__sources.get((symbol, timestamp))
+
+    def get_stored_quote(self, symbol, timestamp):
+        if (self.price_store is None):
+            return None
+        with self.calculator.tracer.span("quote_lookup", symbol=symbol, timestamp=timestamp) as span:
+            quote = self.price_store.get_quote(self.get_quote_key(), symbol, self.timeframe, timestamp)
+            span["cache"] = "miss" if quote is None else "hit"
+        return None if quote is None else PriceQuote(*quote)
+
+    def settle(self, symbol, timestamp, candles):
+        # candles is [(exchange_id, candle)] in priority order, None when no exchange has the candle
+        quote = self.decide(candles)
+        if (quote is None):
+            return None
+        self.remember(symbol, timestamp, quote)
+        if (self.price_store is not None and self.calculator.is_candle_closed(timestamp)):
+            self.price_store.put_quote(self.get_quote_key(), symbol, self.timeframe, timestamp, quote.price, quote.source)
+        return quote
+
+    def remember(self, symbol, timestamp, quote):
+        with self.__lock:
+            self.__sources[(symbol, timestamp)] = quote.source
+        if (self.calculator.verbose):
+            print(symbol, " price at midnight: ", quote.price, " (", quote.source, ")")
+
+    def decide(self, candles):
+        answered = [(exchange_id, candle) for exchange_id, candle in candles if candle is not None]
+        if (not answered):
+            return None
+        if (self.policy == "primary"):
+            exchange_id, candle = answered[0]
+            return PriceQuote(self.calculator.get_price_from_candle(candle), exchange_id)
+        from statistics import median
+        prices = [float(self.calculator.get_price_from_candle(candle)) for exchange_id, candle in answered]
+        return PriceQuote(median(prices), "median(" + ",".join(exchange_id for exchange_id, candle in answered) + ")")
+
+    def get_stored_candles(self, symbol, timestamp):
+        return {exchange_id: self.calculator.get_stored_candle(symbol, timestamp, exchange_id) for exchange_id in self.exchanges}
+
+    def get_missing(self, stored):
+        # the exchanges that have to be asked: with primary only the ones in front of the first stored candle
+        missing = []
+        for exchange_id in self.exchanges:
+            if (stored[exchange_id] is not None):
+                if (self.policy == "primary"):
+                    break
+                continue
+            if (self.is_available(exchange_id)):
+                missing.append(exchange_id)
+        return missing
+
+    def is_available(self, exchange_id):
+        with self.__lock:
+            return self.__failed_until.get(exchange_id, 0) <= time.time()
+
+    def quote(self, symbol, timestamp):
+        # the price of symbol in the candle that starts at timestamp, None when no exchange has it
+        quote = self.get_stored_quote(symbol, timestamp)
+        if (quote is not None):
+            self.remember(symbol, timestamp, quote)
+            return quote
+        with self.calculator.tracer.span("price_quote", symbol=symbol, timestamp=timestamp, policy=self.policy) as span:
+            stored = self.get_stored_candles(symbol, timestamp)
+            missing = self.get_missing(stored)
+            futures = {}
+            if (missing):
+                pool = self.get_pool()
+                for exchange_id in missing:
+                    start = FetchStart()
+                    futures[exchange_id] = (pool.submit(self.fetch_candle, exchange_id, symbol, timestamp, start), start)
+            def get_candle(exchange_id):
+                if (exchange_id in futures):
+                    future, start = futures[exchange_id]
+                    return self.wait_for_candle(exchange_id, symbol, future, start)
+                return stored[exchange_id]
+            candles = self.collect(get_candle)
+            quote = self.settle(symbol, timestamp, candles)
+            span["source"] = None if quote is None else quote.source
+        return quote
+
+    def collect(self, get_candle):
+        # [(exchange_id, candle)] in priority order for settle, get_candle(exchange_id) gives the stored or fetched candle
+        candles = []
+        for exchange_id in self.exchanges:
+            candle = get_candle(exchange_id)
+            candles.append((exchange_id, candle))
+            if (candle is not None and self.policy == "primary"):
+                # the exchanges behind this one are only fallbacks, whatever they still fetch is just stored
+                break
+        return candles
+
+    def get_pool(self):
+        # one thread per exchange is enough, a slow exchange only holds up its own calls
+        with self.__lock:
+            if (self.__pool is None):
+                from concurrent.futures import ThreadPoolExecutor
+                self.__pool = ThreadPoolExecutor(max_workers=2 * len(self.exchanges), thread_name_prefix="prices")
+            return self.__pool
+
+    def wait_for_candle(self, exchange_id, symbol, future, start):
+        from concurrent.futures import TimeoutError
+        try:
+            return future.result(timeout=max(start.wait_until(self.timeout) - time.time(), 0))
+        except TimeoutError:
+            self.report_failure(exchange_id, symbol, "no answer within " + str(self.timeout) + "s")
+            return None
+
+    def fetch_candle(self, exchange_id, symbol, timestamp, start):
+        # runs on the pool, every failure is reported and turns into a missing candle so the other exchanges decide.
+        # Waiting for the exchange lock is not a failure, every call ahead is bounded by the exchange timeout itself
+        try:
+            with self.__exchange_locks[exchange_id]:
+                start.mark()
+                exchange = self.calculator.get_exchange(exchange_id)
+                candle = self.calculator.fetch_candle(exchange, symbol, self.timeframe, timestamp, exchange_id)
+        except Exception as e:
+            self.report_failure(exchange_id, symbol, repr(e))
+            return None
+        finally:
+            start.mark()
+        self.calculator.store_candle(symbol, candle, exchange_id)
+        return candle
+
+    def connect(self):
+        # creates every client and loads its markets, so a long running process does not pay for it at midnight
+        self.call_each(lambda exchange_id, exchange: exchange.load_markets() if hasattr(exchange, "load_markets") else None)
+
+    def warm(self, symbol):
+        # one cheap call to every exchange, so the candle requests that follow reuse open connections
+        self.call_each(lambda exchange_id, exchange: self.calculator.fetch_ticker(exchange, symbol, exchange_id))
+
+    def call_each(self, call):
+        def call_one(exchange_id, start):
+            try:
+                with self.__exchange_locks[exchange_id]:
+                    start.mark()
+                    call(exchange_id, self.calculator.get_exchange(exchange_id))
+            except Exception as e:
+                self.report_failure(exchange_id, None, repr(e))
+            finally:
+                start.mark()
+        starts = [FetchStart() for exchange_id in self.exchanges]
+        futures = [self.get_pool().submit(call_one, exchange_id, start) for exchange_id, start in zip(self.exchanges, starts)]
+        from concurrent.futures import TimeoutError
+        for exchange_id, future, start in zip(self.exchanges, futures, starts):
+            try:
+                future.result(timeout=max(start.wait_until(self.timeout) - time.time(), 0))
+            except TimeoutError:
+                self.report_failure(exchange_id, None, "no answer within " + str(self.timeout) + "s")
+
+    def report_failure(self, exchange_id, symbol, error):
+        # a venue that is slow or down is left out, the drawing goes on with the others
+        with self.__lock:
+            self.__failed_until[exchange_id] = time.time() + EXCHANGE_RETRY_SECONDS
+        self.calculator.report_exchange_failure(exchange_id + ("" if symbol is None else " " + symbol) + ": " + str(error))
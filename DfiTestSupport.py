@@ -0,0 +1,76 @@
+import argparse, json, logging, os, subprocess, sys, tempfile
+from datetime import datetime, timezone
+from dateutil.parser import parse
+from DfiBlockSource import BlockHeader, format_block_time
+from DfiLotteryBench import synthetic_chain
+from DfiLotteryCalculator import AVERAGE_BLOCK_SECONDS, DfiLotteryCalculator
+
+# drawing 5 (2022-02-05, 60 tickets) won with ticket 9, see dfi_lotto_past_results.txt.  The drawing 5 fixtures are
+# synthetic: only the published values (prices, first block, last 4 of its hash and minter) are real
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(PACKAGE_DIR, "fixtures")
+DRAWING5_CHAIN = os.path.join(FIXTURES_DIR, "drawing5_chain.json")
+DRAWING5_PRICES = os.path.join(FIXTURES_DIR, "drawing5_prices.json")
+DRAWING5_ARCHIVE = os.path.join(FIXTURES_DIR, "drawing5.json.gz")
+DRAWING5_MIDNIGHT = 1644019200000
+
+# published drawings as printed in dfi_lotto_past_results.txt, written out by hand so they do not depend on any fixture:
+# (dfi, btc, first block, last 4 of its hash, last 4 of its minter, tickets, first_concat, sha256_result, winning_ticket)
+PUBLISHED_DRAWINGS = {
+    5: (2.793, 41603.4, 1598835, "e4a9", "k1cn", 60, "1161981598835e4a9k1cn",
+        "28505e2b32e56684c96fc85273b793ac60f808294c25f2b72bdb838f79a6cd11", 9),
+    4: (2.588, 37812.7, 1578717, "a41b", "hB7e", 79, "978591578717a41bhB7e",
+        "68a23c266567b01fcc6bfc78c61a5515c6372acda3f13080dc6f50725b8618db", 32),
+    3: (2.581, 36433.5, 1558674, "ecbd", "rftf", 343, "940351558674ecbdrftf",
+        "ca0e825c2ebeb16133f28ce633cab478d32e8ef09dc795135fd5252e6bee899e", 271),
+    2: (3.004, 42999.9, 1538481, "6bcc", "cTZp", 65, "12917215384816bcccTZp",
+        "89fe41049bcc960d61bb5083b8837e6b8d3f5da33d6a966b92948763fa15d24e", 35),
+}
+
+# seconds from midnight of the blocks around the boundary of out_of_order_chain, the way a chain only bound by the
+# median time past can stamp them.  The first block of the day is the one after the -3
+OUT_OF_ORDER_OFFSETS = [-300, -240, -200, -90, 25, -20, -10, 40, 5, -3, 60, 90, 120]
+
+def create_calculator(*argv, block_source=None):
+    # the calc command line without a config file, configured like a run would be
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    calculator = DfiLotteryCalculator(logging.getLogger("test_dfi_lotto_calc"), subparsers)
+    calculator.configure(parser.parse_args(["calc", "-t", "60", "-d", "2022-02-05", "-nc", "-nh"] + list(argv)), block_source=block_source)
+    calculator.quiet = True
+    return calculator
+
+def run_calc(*argv):
+    # a whole dfi_lotto_calc.py run in an empty directory, so no config, store or log of this checkout is used
+    with tempfile.TemporaryDirectory() as workdir:
+        return subprocess.run([sys.executable, os.path.join(PACKAGE_DIR, "dfi_lotto_calc.py"), "calc", "-t", "60", "-d", "2022-02-05",
+                               "-b", "1598835", "-nh"] + list(argv), cwd=workdir, capture_output=True, text=True, timeout=120)
+
+def run_command(*argv):
+    # one dfi_lotto_calc.py command in this process, with every command wired up like a run would have them
+    from dfi_lotto_calc import create_commands
+    parser = argparse.ArgumentParser()
+    create_commands(logging.getLogger("test_dfi_lotto_calc"), parser.add_subparsers())
+    args = parser.parse_args(list(argv))
+    return args.func(args)
+
+def write_chain(path, headers):
+    # a -fake_chain file of headers
+    with open(path, "w") as f:
+        json.dump([header._asdict() for header in headers], f)
+
+def brute_force_first_block(headers, times, target_date):
+    # the block after the last block from before midnight, times are the parsed header timestamps, parsed once per chain
+    midnight = datetime(target_date.year, target_date.month, target_date.day)
+    return max(header.height for header, time in zip(headers, times) if time < midnight) + 1
+
+def out_of_order_chain(rng, start, midnight, days):
+    # a synthetic chain whose block times around midnight go back and forth like OUT_OF_ORDER_OFFSETS
+    headers = synthetic_chain(rng, start, 1500000, days * 86400 // AVERAGE_BLOCK_SECONDS)
+    boundary = next(i for i, header in enumerate(headers) if parse(header.timestamp) >= midnight) - 6
+    unix_midnight = int(midnight.replace(tzinfo=timezone.utc).timestamp())
+    for i, offset in enumerate(OUT_OF_ORDER_OFFSETS):
+        header = headers[boundary + i]
+        headers[boundary + i] = BlockHeader(header.height, header.hash, format_block_time(unix_midnight + offset), header.minter,
+                                            header.prev_block, header.next_block)
+    return headers
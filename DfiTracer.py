@@ -0,0 +1,128 @@
+import json, os, threading, time
+
+# histogram buckets in seconds, from a cached block lookup up to a slow page load
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+METRIC_PREFIX = "dfi_lotto_"
+
+class DfiTracer:
+
+    # opt-in spans around block lookups, HTTP requests, exchange calls and hashing: every finished span is
+    # appended to trace_log as one JSON line, and metrics_file gets Prometheus text format totals when the run ends.
+    # While neither is set span() hands back a shared no-op span, so the traced code pays for one call.
+    def __init__(self, trace_log=None, metrics_file=None):
+        self.trace_log = trace_log
+        self.metrics_file = metrics_file
+        self.enabled = trace_log is not None or metrics_file is not None
+        self.run_id = None
+        if (self.enabled):
+            import uuid
+            self.run_id = uuid.uuid4().hex[:16]
+        self.__lock = threading.Lock()
+        self.__log = open(trace_log, "a") if trace_log is not None else None
+        self.__durations = {}
+        self.__counters = {}
+
+    def span(self, name, **attributes):
+        if (not self.enabled):
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def finish(self, span):
+        with self.__lock:
+            if (self.__log is not None):
+                record = {"run": self.run_id, "span": span.name, "start": round(span.start_time, 6),
+                          "duration_ms": round(span.duration * 1000, 3)}
+                record.update(span.attributes)
+                self.__log.write(json.dumps(record, default=str) + "\n")
+                self.__log.flush()
+            durations = self.__durations.setdefault(span.name, [0] * len(DURATION_BUCKETS) + [0, 0.0])
+            for i, bucket in enumerate(DURATION_BUCKETS):
+                if (span.duration <= bucket):
+                    durations[i] += 1
+            durations[-2] += 1
+            durations[-1] += span.duration
+            if ("error" in span.attributes):
+                self.count("span_errors_total", span=span.name)
+            if ("cache" in span.attributes):
+                self.count("cache_lookups_total", span=span.name, result=span.attributes["cache"])
+            if ("status" in span.attributes):
+                self.count("http_responses_total", status=span.attributes["status"])
+            if (span.attributes.get("bytes")):
+                self.count("http_bytes_total", value=span.attributes["bytes"])
+            if (span.attributes.get("retries")):
+                self.count("http_retries_total", value=span.attributes["retries"])
+
+    def count(self, metric, value=1, **labels):
+        # callers hold the lock
+        key = (metric, tuple(sorted((label, str(label_value)) for label, label_value in labels.items())))
+        self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def write_metrics(self):
+        if (self.metrics_file is None):
+            return
+        with self.__lock:
+            lines = ["# HELP " + METRIC_PREFIX + "span_duration_seconds Duration of traced operations",
+                     "# TYPE " + METRIC_PREFIX + "span_duration_seconds histogram"]
+            for name in sorted(self.__durations):
+                durations = self.__durations[name]
+                for i, bucket in enumerate(DURATION_BUCKETS):
+                    lines.append(METRIC_PREFIX + 'span_duration_seconds_bucket{span="' + name + '",le="' + str(bucket) + '"} ' + str(durations[i]))
+                lines.append(METRIC_PREFIX + 'span_duration_seconds_bucket{span="' + name + '",le="+Inf"} ' + str(durations[-2]))
+                lines.append(METRIC_PREFIX + 'span_duration_seconds_sum{span="' + name + '"} ' + repr(durations[-1]))
+                lines.append(METRIC_PREFIX + 'span_duration_seconds_count{span="' + name + '"} ' + str(durations[-2]))
+            typed = set()
+            for (metric, labels), value in sorted(self.__counters.items()):
+                if (metric not in typed):
+                    lines.append("# TYPE " + METRIC_PREFIX + metric + " counter")
+                    typed.add(metric)
+                label_text = ",".join(label + '="' + label_value + '"' for label, label_value in labels)
+                lines.append(METRIC_PREFIX + metric + ("{" + label_text + "}" if label_text else "") + " " + str(value))
+            lines.append("# TYPE " + METRIC_PREFIX + "last_run_timestamp_seconds gauge")
+            lines.append(METRIC_PREFIX + "last_run_timestamp_seconds " + str(int(time.time())))
+        # written next to the target and renamed, so a node_exporter textfile collector never reads half a file
+        temp_file = self.metrics_file + ".tmp"
+        with open(temp_file, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_file, self.metrics_file)
+
+    def close(self):
+        self.write_metrics()
+        with self.__lock:
+            if (self.__log is not None):
+                self.__log.close()
+                self.__log = None
+
+class Span:
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __setitem__(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self.__start
+        if (exc_value is not None):
+            self.attributes["error"] = repr(exc_value)
+        self.tracer.finish(self)
+        return False
+
+class NullSpan:
+
+    def __setitem__(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_SPAN = NullSpan()
@@ -0,0 +1,52 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from DfiDrawingEngine import compute_winning_ticket
+
+class DrawingHTTPServer(ThreadingHTTPServer):
+
+    # readers come in bursts right after a drawing is published
+    daemon_threads = True
+    request_queue_size = 128
+
+class DrawingRequestHandler(BaseHTTPRequestHandler):
+
+    # keep-alive, so a reader polling for the result reuses its connection
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        drawings = self.server.drawings
+        if (url.path == "/status"):
+            return self.send_json(200, json.dumps(drawings.get_status(), sort_keys=True).encode("utf-8"))
+        if (url.path != "/drawing"):
+            return self.send_error_json(404, "unknown path " + url.path + ", try /drawing or /status")
+        published = drawings.get_drawing(query.get("date"))
+        if (published is None):
+            return self.send_error_json(404, "no drawing published for " + query.get("date", "any date") + " yet")
+        drawing, body = published
+        if ("tickets" in query):
+            try:
+                result = compute_winning_ticket(drawings.drawing_inputs(drawing, int(query["tickets"])))
+            except ValueError as e:
+                return self.send_error_json(400, "bad tickets value " + query["tickets"] + ": " + str(e))
+            drawing = dict(drawing)
+            drawing.update(result._asdict())
+            body = json.dumps(drawing, sort_keys=True).encode("utf-8")
+        self.send_json(200, body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, json.dumps({"error": message}).encode("utf-8"))
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # one line per reader would drown the drawing output
+        pass
@@ -0,0 +1,91 @@
+import sqlite3, threading
+from datetime import datetime, timezone
+
+# columns of a drawing result, in the order they are stored and printed
+HISTORY_FIELDS = ["drawing", "target_date", "total_number_of_tickets", "dfi_at_midnight", "btc_at_midnight",
+                  "multiply_dfi_by_btc", "first_block_of_target_date", "last_4_digits_of_block_hash",
+                  "last_4_digits_of_block_minter", "first_concat", "sha256_result", "second_concat",
+                  "decimal_of_second_concat", "decimal_result", "winning_ticket", "source", "price_source", "recorded_at"]
+
+class DrawingHistory:
+
+    # one row per drawing result, indexed by drawing number, target date and first block so lookups are B-tree searches
+    def __init__(self, db_path):
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        self.__db.row_factory = sqlite3.Row
+        with self.__lock, self.__db:
+            self.__db.execute("CREATE TABLE IF NOT EXISTS drawings ("
+                              "drawing INTEGER, target_date TEXT NOT NULL, total_number_of_tickets INTEGER NOT NULL, "
+                              "dfi_at_midnight REAL, btc_at_midnight REAL, multiply_dfi_by_btc INTEGER, "
+                              "first_block_of_target_date INTEGER NOT NULL, last_4_digits_of_block_hash TEXT, "
+                              "last_4_digits_of_block_minter TEXT, first_concat TEXT NOT NULL, sha256_result TEXT, "
+                              "second_concat TEXT, decimal_of_second_concat INTEGER, decimal_result REAL, "
+                              "winning_ticket INTEGER NOT NULL, source TEXT, price_source TEXT, recorded_at TEXT, "
+                              # re-running a drawing with the same inputs updates its row instead of adding another one
+                              "UNIQUE (target_date, total_number_of_tickets, first_concat))")
+            # stores made before price sources were recorded get the column added
+            columns = [row["name"] for row in self.__db.execute("PRAGMA table_info(drawings)")]
+            if ("price_source" not in columns):
+                self.__db.execute("ALTER TABLE drawings ADD COLUMN price_source TEXT")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS drawings_drawing ON drawings (drawing)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS drawings_target_date ON drawings (target_date)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS drawings_first_block ON drawings (first_block_of_target_date)")
+
+    def put(self, result, target_date, drawing=None, source="calc", price_source=None):
+        # result is a DrawingResult (or anything with its fields), target_date a date/datetime or an ISO date string,
+        # price_source the exchange(s) the midnight prices came from
+        row = {field: getattr(result, field, None) for field in HISTORY_FIELDS}
+        row["drawing"] = None if drawing in (None, "") else int(drawing)
+        row["target_date"] = format_target_date(target_date)
+        row["source"] = source
+        row["price_source"] = price_source
+        row["recorded_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT INTO drawings (" + ", ".join(HISTORY_FIELDS) + ") VALUES (" + ", ".join(["?"] * len(HISTORY_FIELDS)) + ") "
+                              "ON CONFLICT (target_date, total_number_of_tickets, first_concat) DO UPDATE SET "
+                              "drawing = COALESCE(excluded.drawing, drawing), winning_ticket = excluded.winning_ticket, "
+                              "source = excluded.source, price_source = COALESCE(excluded.price_source, price_source), recorded_at = excluded.recorded_at",
+                              [row[field] for field in HISTORY_FIELDS])
+
+    def find(self, drawing=None, target_date=None, date_from=None, date_to=None, block=None, winning_ticket=None):
+        # every filter is optional and they are combined with AND, rows come back newest drawing first
+        conditions = []
+        params = []
+        if (drawing is not None):
+            conditions.append("drawing = ?")
+            params.append(int(drawing))
+        if (target_date is not None):
+            conditions.append("target_date = ?")
+            params.append(format_target_date(target_date))
+        if (date_from is not None):
+            conditions.append("target_date >= ?")
+            params.append(format_target_date(date_from))
+        if (date_to is not None):
+            conditions.append("target_date <= ?")
+            params.append(format_target_date(date_to))
+        if (block is not None):
+            conditions.append("first_block_of_target_date = ?")
+            params.append(int(block))
+        if (winning_ticket is not None):
+            conditions.append("winning_ticket = ?")
+            params.append(int(winning_ticket))
+        query = "SELECT " + ", ".join(HISTORY_FIELDS) + " FROM drawings"
+        if (conditions):
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY target_date DESC, drawing DESC"
+        with self.__lock:
+            return [dict(row) for row in self.__db.execute(query, params).fetchall()]
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+def format_target_date(target_date):
+    # drawings are stored by their ISO date so text order is date order and range queries can use the index
+    if (hasattr(target_date, "date")):
+        return target_date.date().isoformat()
+    if (hasattr(target_date, "isoformat")):
+        return target_date.isoformat()
+    from dateutil.parser import parse
+    return parse(str(target_date)).date().isoformat()
@@ -0,0 +1,103 @@
+import gzip, json, os, threading
+
+FIXTURE_VERSION = 1
+
+class FixtureArchive:
+
+    # every block page / RPC reply and every OHLCV response of a run, kept in one gzipped JSON file so a run can be replayed offline
+    def __init__(self, path, replay=False):
+        self.path = path
+        self.replay = replay
+        self.__lock = threading.Lock()
+        self.__http = {}
+        self.__ohlcv = {}
+        self.__tickers = {}
+        if (replay or os.path.isfile(path)):
+            # recording into an existing archive adds to it
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                archive = json.load(f)
+            if (archive.get("version") != FIXTURE_VERSION):
+                raise ValueError("fixture archive " + path + " has version " + str(archive.get("version")) + ", expected " + str(FIXTURE_VERSION))
+            self.__http = archive["http"]
+            self.__ohlcv = archive["ohlcv"]
+            self.__tickers = archive["tickers"]
+
+    def http_key(self, method, url, data=None):
+        if (data is None):
+            return method + " " + url
+        return method + " " + url + " " + str(data)
+
+    def get_http(self, method, url, data=None):
+        key = self.http_key(method, url, data)
+        with self.__lock:
+            response = self.__http.get(key)
+        if (response is None):
+            raise ValueError("no recorded response for " + key + " in " + self.path)
+        return ReplayedResponse(response["status_code"], response["text"])
+
+    def put_http(self, method, url, data, response):
+        with self.__lock:
+            self.__http[self.http_key(method, url, data)] = {"status_code": response.status_code, "text": response.text}
+
+    def ohlcv_key(self, exchange_id, symbol, timeframe, since, limit):
+        return "{} {} {} {} {}".format(exchange_id, symbol, timeframe, since, limit)
+
+    def get_ohlcv(self, exchange_id, symbol, timeframe, since, limit):
+        key = self.ohlcv_key(exchange_id, symbol, timeframe, since, limit)
+        with self.__lock:
+            ohlcvs = self.__ohlcv.get(key)
+        if (ohlcvs is None):
+            raise ValueError("no recorded OHLCV response for " + key + " in " + self.path)
+        return ohlcvs
+
+    def put_ohlcv(self, exchange_id, symbol, timeframe, since, limit, ohlcvs):
+        with self.__lock:
+            self.__ohlcv[self.ohlcv_key(exchange_id, symbol, timeframe, since, limit)] = ohlcvs
+
+    def get_ticker(self, exchange_id, symbol):
+        with self.__lock:
+            return self.__tickers.get(exchange_id + " " + symbol)
+
+    def put_ticker(self, exchange_id, symbol, ticker):
+        with self.__lock:
+            self.__tickers[exchange_id + " " + symbol] = ticker
+
+    def save(self):
+        if (self.replay):
+            return
+        with self.__lock:
+            archive = {"version": FIXTURE_VERSION, "http": self.__http, "ohlcv": self.__ohlcv, "tickers": self.__tickers}
+            with gzip.open(self.path, "wt", encoding="utf-8") as f:
+                json.dump(archive, f, sort_keys=True, separators=(",", ":"))
+
+class ReplayedResponse:
+
+    # the parts of a requests.Response the block sources use
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+class FixtureExchange:
+
+    # stands in for a ccxt exchange: replays recorded responses, or passes calls through to exchange and records them
+    def __init__(self, archive, exchange_id, exchange=None):
+        self.archive = archive
+        self.exchange_id = exchange_id
+        self.exchange = exchange
+
+    def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        if (self.archive.replay):
+            return self.archive.get_ohlcv(self.exchange_id, symbol, timeframe, since, limit)
+        ohlcvs = self.exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+        self.archive.put_ohlcv(self.exchange_id, symbol, timeframe, since, limit, ohlcvs)
+        return ohlcvs
+
+    def fetch_ticker(self, symbol):
+        if (self.archive.replay):
+            return self.archive.get_ticker(self.exchange_id, symbol)
+        ticker = self.exchange.fetch_ticker(symbol)
+        self.archive.put_ticker(self.exchange_id, symbol, ticker)
+        return ticker
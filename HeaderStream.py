@@ -0,0 +1,91 @@
+from collections import deque
+from DfiBlockSource import parse_block_time
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_STREAM_WORKERS = 4
+
+class CompactHeader:
+
+    # one block header in five fixed slots: no per-record __dict__, the time as unix seconds and the hashes as their
+    # 32 raw bytes, so a few thousand of them in flight stay in the hundreds of KB whatever the length of the sync
+    __slots__ = ("height", "time", "hash", "prev_hash", "minter")
+
+    def __init__(self, height, time, block_hash, prev_hash, minter):
+        self.height = height
+        self.time = time
+        self.hash = block_hash
+        self.prev_hash = prev_hash
+        self.minter = minter
+
+    @classmethod
+    def from_header(cls, header):
+        return cls(int(header.height), parse_block_time(header.timestamp), pack_hash(header.hash), pack_hash(header.prev_block), header.minter)
+
+    def block_hash(self):
+        return unpack_hash(self.hash)
+
+    def prev_block_hash(self):
+        return unpack_hash(self.prev_hash)
+
+def pack_hash(block_hash):
+    # block hashes are 64 hex digits, prev_block is None when the source does not link the parent
+    if (block_hash is None):
+        return None
+    return bytes.fromhex(block_hash)
+
+def unpack_hash(block_hash):
+    if (block_hash is None):
+        return None
+    return block_hash.hex()
+
+class HeaderStream:
+
+    # walks a contiguous run of block heights in batches of batch_size, with up to workers batches being fetched at
+    # once, and yields CompactHeader records in height order.  The next batches are fetched while the caller works on
+    # the current one, and since at most workers batches are ever held, memory does not grow with the length of the run.
+    def __init__(self, calculator, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_STREAM_WORKERS):
+        self.calculator = calculator
+        self.batch_size = max(batch_size, 1)
+        self.workers = max(workers, 1)
+
+    def headers(self, first_height, last_height=None):
+        # from first_height up to last_height (inclusive), or up to the tip of the chain when last_height is None
+        from concurrent.futures import ThreadPoolExecutor
+        in_flight = deque()
+        next_height = first_height
+        previous = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while (True):
+                    while (len(in_flight) < self.workers and (last_height is None or next_height <= last_height)):
+                        heights = list(range(next_height, next_height + self.batch_size if last_height is None
+                                             else min(next_height + self.batch_size, last_height + 1)))
+                        in_flight.append((heights, pool.submit(self.fetch_batch, heights)))
+                        next_height = heights[-1] + 1
+                    if (not in_flight):
+                        return
+                    heights, future = in_flight.popleft()
+                    batch = future.result()
+                    for record in batch:
+                        if (previous is not None):
+                            self.check_link(previous, record)
+                        previous = record
+                        yield record
+                    if (len(batch) < len(heights)):
+                        # the tip of the chain is in this batch, later batches have nothing
+                        return
+            finally:
+                # the caller stopped early (or the tip was reached), do not wait for batches nobody will read
+                for heights, future in in_flight:
+                    future.cancel()
+
+    def fetch_batch(self, heights):
+        return [CompactHeader.from_header(header) for header in self.calculator.get_block_headers(heights)]
+
+    def check_link(self, previous, record):
+        # the headers have to form one chain, a node that reorganised in the middle of a sync would break the links
+        if (record.height != previous.height + 1):
+            raise ValueError("header sync expected block " + str(previous.height + 1) + ", got " + str(record.height))
+        if (record.prev_hash is not None and record.prev_hash != previous.hash):
+            raise ValueError("block " + str(record.height) + " does not follow block " + str(previous.height) +
+                             ", the chain changed during the sync, run it again")
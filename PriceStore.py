@@ -0,0 +1,55 @@
+import sqlite3, threading
+
+class PriceStore:
+
+    # closed candles never change, so each (exchange, symbol, timeframe, start time) only has to be fetched once
+    def __init__(self, db_path):
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(db_path, check_same_thread=False)
+        with self.__lock, self.__db:
+            self.__db.execute("CREATE TABLE IF NOT EXISTS candles ("
+                              "exchange TEXT NOT NULL, symbol TEXT NOT NULL, timeframe TEXT NOT NULL, timestamp INTEGER NOT NULL, "
+                              "open REAL, high REAL, low REAL, close REAL, volume REAL, "
+                              "PRIMARY KEY (exchange, symbol, timeframe, timestamp))")
+            # the price a drawing used, decided from the candles of one or more exchanges (see DfiPriceSource),
+            # keyed by the policy and exchanges that decided it
+            self.__db.execute("CREATE TABLE IF NOT EXISTS quotes ("
+                              "quote_key TEXT NOT NULL, symbol TEXT NOT NULL, timeframe TEXT NOT NULL, timestamp INTEGER NOT NULL, "
+                              "price REAL, source TEXT, "
+                              "PRIMARY KEY (quote_key, symbol, timeframe, timestamp))")
+
+    def get(self, exchange, symbol, timeframe, timestamp):
+        # returns the candle the way ccxt does: [timestamp, open, high, low, close, volume]
+        with self.__lock:
+            row = self.__db.execute("SELECT timestamp, open, high, low, close, volume FROM candles "
+                                    "WHERE exchange = ? AND symbol = ? AND timeframe = ? AND timestamp = ?",
+                                    (exchange, symbol, timeframe, int(timestamp))).fetchone()
+        if (row is None):
+            return None
+        return list(row)
+
+    def put(self, exchange, symbol, timeframe, candle):
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO candles (exchange, symbol, timeframe, timestamp, open, high, low, close, volume) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (exchange, symbol, timeframe, int(candle[0]), candle[1], candle[2], candle[3], candle[4], candle[5]))
+
+    def get_quote(self, quote_key, symbol, timeframe, timestamp):
+        # (price, source) or None
+        with self.__lock:
+            row = self.__db.execute("SELECT price, source FROM quotes "
+                                    "WHERE quote_key = ? AND symbol = ? AND timeframe = ? AND timestamp = ?",
+                                    (quote_key, symbol, timeframe, int(timestamp))).fetchone()
+        if (row is None):
+            return None
+        return tuple(row)
+
+    def put_quote(self, quote_key, symbol, timeframe, timestamp, price, source):
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO quotes (quote_key, symbol, timeframe, timestamp, price, source) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (quote_key, symbol, timeframe, int(timestamp), price, source))
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
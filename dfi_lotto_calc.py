@@ -2,6 +2,14 @@ import argparse, logging, os.path, sys
 from configparser import ConfigParser
 from os import path
 from DfiLotteryCalculator import DfiLotteryCalculator
+from DfiLotteryBatch import DfiLotteryBatch
+from DfiLotterySweep import DfiLotterySweep
+from DfiLotterySimulator import DfiLotterySimulator
+from DfiLotteryHistory import DfiLotteryHistory
+from DfiLotteryDayIndex import DfiLotteryDayIndex
+from DfiLotteryHeaders import DfiLotteryHeaders
+from DfiLotteryServer import DfiLotteryServer
+from DfiLotteryBench import DfiLotteryBench
 
 # constants
 PROGRAM_NAME = "dfi_lotto_calc"
@@ -128,7 +136,15 @@ def configure_logger(logger, config):
 
 def create_commands(logger, subparsers):
     # order matters in the help dialog
-    DfiLotteryCalculator(logger, subparsers)
+    calculator = DfiLotteryCalculator(logger, subparsers)
+    DfiLotteryBatch(logger, subparsers, calculator)
+    DfiLotterySweep(logger, subparsers, calculator)
+    DfiLotterySimulator(logger, subparsers)
+    DfiLotteryHistory(logger, subparsers)
+    DfiLotteryDayIndex(logger, subparsers, calculator)
+    DfiLotteryHeaders(logger, subparsers, calculator)
+    DfiLotteryServer(logger, subparsers, calculator)
+    DfiLotteryBench(logger, subparsers, calculator)
 
 def configure_verbose_option(logger):
     log_handler_std_out = logging.StreamHandler(sys.stdout)
@@ -144,14 +160,22 @@ def read_constants_from_config(logger, config):
             if "defaults" in config and "fpath" in config["defaults"]:
                 args.fpath = config["defaults"]["fpath"]
             if "defaults" in config and "api_key" in config["defaults"]:
-                if (not args.api_key or args.api_key is None):
+                if (not getattr(args, "api_key", None)):
                     args.api_key = config["defaults"]["api_key"]
             if "defaults" in config and "api_secret" in config["defaults"]:
-                if (not args.api_secret or args.api_secret is None):
+                if (not getattr(args, "api_secret", None)):
                     args.api_secret = config["defaults"]["api_secret"]
             if "defaults" in config and "api_password" in config["defaults"]:
-                if (not args.api_password or args.api_password is None):
+                if (not getattr(args, "api_password", None)):
                     args.api_password = config["defaults"]["api_password"]
+            for key in ["block_source", "rpc_url", "rpc_user", "rpc_password", "exchanges", "price_policy", "exchange_timeout"]:
+                if "defaults" in config and key in config["defaults"]:
+                    if (not getattr(args, key, None)):
+                        setattr(args, key, config["defaults"][key])
+            for key in ["block_cache", "price_store", "history", "day_index", "trace_log", "metrics_file"]:
+                if "defaults" in config and key in config["defaults"]:
+                    if (not getattr(args, key, None)):
+                        setattr(args, key, config["defaults"][key])
         except:
             print("WARNING: error reading arguments or config file")
 
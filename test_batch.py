@@ -0,0 +1,33 @@
+import argparse, csv, logging, os, tempfile, unittest
+from DfiLotteryBatch import DfiLotteryBatch
+from DfiLotteryCalculator import DfiLotteryCalculator
+from DfiTestSupport import DRAWING5_CHAIN, DRAWING5_PRICES
+
+class TestCalcBatch(unittest.TestCase):
+
+    def test_rows_of_one_date_share_the_price_lookup(self):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        calculator = DfiLotteryCalculator(logging.getLogger("test_dfi_lotto_calc"), subparsers)
+        DfiLotteryBatch(logging.getLogger("test_dfi_lotto_calc"), subparsers, calculator)
+        with tempfile.TemporaryDirectory() as workdir:
+            manifest = os.path.join(workdir, "drawings.csv")
+            with open(manifest, "w") as f:
+                f.write("drawing,date,tickets,block,dfi,btc\n5,2022-02-05,60,1598835,,\n5,2022-02-05,60,1598900,,\n"
+                        "5,2022-02-05,60,1598870,,\n5,2022-02-05,60,1598835,2.793,41603.4\n,not a date,60,1598835,,\n")
+            out = os.path.join(workdir, "results.csv")
+            args = parser.parse_args(["calc-batch", "-m", manifest, "-out", out, "-j", "4", "-nc", "-nh", "-bs", "fake",
+                                      "-fake_chain", DRAWING5_CHAIN, "-ex", "fake", "-fake_prices", DRAWING5_PRICES])
+            with self.assertRaises(ValueError):
+                # the row without a date fails, the others go on
+                args.func(args)
+            with open(out, newline="") as f:
+                results = sorted(csv.DictReader(f), key=lambda result: int(result["row"]))
+        self.assertEqual([result["winning_ticket"] for result in results], ["9", "9", "9", "9", ""])
+        self.assertEqual([result["price_source"] for result in results[:4]], ["fake", "fake", "fake", "manifest"])
+        self.assertTrue(results[4]["error"])
+        # one DFI and one BTC candle for the three rows that needed prices
+        self.assertEqual(calculator.candle_fetches, 2)
+
+if __name__ == "__main__":
+    unittest.main()
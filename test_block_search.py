@@ -0,0 +1,64 @@
+import random, unittest
+from datetime import datetime, timedelta
+from dateutil.parser import parse
+from DfiBlockSource import BlockNotFound, FakeBlockSource
+from DfiLotteryBench import synthetic_chain
+from DfiLotteryCalculator import AVERAGE_BLOCK_SECONDS
+from DfiTestSupport import OUT_OF_ORDER_OFFSETS, brute_force_first_block, create_calculator, out_of_order_chain
+
+class TestFindFirstBlockOfDate(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(5)
+        # real chains go back far enough for any gallop, the synthetic ones start days before the target dates
+        self.start = datetime(2022, 1, 29)
+
+    def check(self, headers, times, start_height, target_date, prefetch_workers=1):
+        calculator = create_calculator("-w", str(prefetch_workers), block_source=FakeBlockSource(headers))
+        self.assertEqual(calculator.find_first_block_of_date(start_height, target_date), brute_force_first_block(headers, times, target_date))
+
+    def test_forward_and_backward(self):
+        for seed in range(3):
+            self.rng.seed(seed)
+            headers = synthetic_chain(self.rng, self.start, 1500000, 8 * 86400 // AVERAGE_BLOCK_SECONDS)
+            times = [parse(header.timestamp) for header in headers]
+            for target_date in [datetime(2022, 2, 2), datetime(2022, 2, 3), datetime(2022, 2, 4)]:
+                for prefetch_workers in [1, 4]:
+                    # a block from the morning before the target date, and one from the day after it
+                    self.check(headers, times, brute_force_first_block(headers, times, target_date - timedelta(hours=9)), target_date, prefetch_workers)
+                    self.check(headers, times, brute_force_first_block(headers, times, target_date + timedelta(hours=30)), target_date, prefetch_workers)
+
+    def test_block_times_out_of_order_at_midnight(self):
+        midnight = datetime(2022, 2, 4)
+        headers = out_of_order_chain(self.rng, self.start, midnight, 8)
+        times = [parse(header.timestamp) for header in headers]
+        first_block = brute_force_first_block(headers, times, midnight)
+        # the first block of the day follows the last pre-midnight block, not the first post-midnight one
+        self.assertEqual(times[first_block - headers[0].height - 1], midnight - timedelta(seconds=3))
+        self.assertLess(next(header.height for header, time in zip(headers, times) if time >= midnight), first_block)
+        for prefetch_workers in [1, 4]:
+            # from far on both sides, and from every block of the boundary
+            self.check(headers, times, brute_force_first_block(headers, times, midnight - timedelta(hours=9)), midnight, prefetch_workers)
+            self.check(headers, times, brute_force_first_block(headers, times, midnight + timedelta(hours=30)), midnight, prefetch_workers)
+            for offset in range(-8, len(OUT_OF_ORDER_OFFSETS) + 2):
+                self.check(headers, times, first_block - 10 + offset, midnight, prefetch_workers)
+
+    def test_first_block_of_date_is_the_tip(self):
+        headers = synthetic_chain(self.rng, self.start, 1500000, 4 * 86400 // AVERAGE_BLOCK_SECONDS)
+        midnight = datetime(2022, 2, 1)
+        times = [parse(header.timestamp) for header in headers]
+        # cut the chain right after the first block of midnight
+        tip = brute_force_first_block(headers, times, midnight) - headers[0].height + 1
+        headers, times = headers[:tip], times[:tip]
+        for prefetch_workers in [1, 4]:
+            self.check(headers, times, headers[0].height, midnight, prefetch_workers)
+
+    def test_date_past_the_tip(self):
+        headers = synthetic_chain(self.rng, self.start, 1500000, 4 * 86400 // AVERAGE_BLOCK_SECONDS)
+        for prefetch_workers in [1, 4]:
+            calculator = create_calculator("-w", str(prefetch_workers), block_source=FakeBlockSource(headers))
+            with self.assertRaises(BlockNotFound):
+                calculator.find_first_block_of_date(headers[-2 * 86400 // AVERAGE_BLOCK_SECONDS].height, datetime(2022, 2, 3))
+
+if __name__ == "__main__":
+    unittest.main()
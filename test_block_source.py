@@ -0,0 +1,50 @@
+import json, os, random, tempfile, unittest
+from datetime import datetime
+from BlockHeaderCache import BlockHeaderCache
+from DfiBlockSource import DefiscanBlockSource, FakeBlockSource
+from DfiLotteryBench import synthetic_block_page, synthetic_chain
+from DfiTestSupport import create_calculator
+from HeaderStream import HeaderStream
+
+class TestPrevBlock(unittest.TestCase):
+
+    def setUp(self):
+        self.headers = synthetic_chain(random.Random(5), datetime(2022, 2, 4, 23), 1598700, 20)
+
+    def parse(self, header):
+        return DefiscanBlockSource(session=object()).parse_block_page(header.height, synthetic_block_page(header))
+
+    def test_defiscan_page_links_the_previous_hash(self):
+        self.assertEqual(self.parse(self.headers[5]), self.headers[5])
+        # a link that carries a height is not a hash and is not passed on as one
+        self.assertIsNone(self.parse(self.headers[5]._replace(prev_block="1598704")).prev_block)
+
+    def test_fake_chain_and_block_cache_only_keep_hashes(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "chain.json")
+            with open(path, "w") as f:
+                json.dump([dict(self.headers[1]._asdict(), prev_block=1598700), self.headers[2]._asdict()], f)
+            chain = FakeBlockSource.from_file(path)
+            self.assertIsNone(chain.get_block(1598701).prev_block)
+            self.assertEqual(chain.get_block(1598702).prev_block, self.headers[1].hash)
+            cache = BlockHeaderCache(os.path.join(workdir, "blocks.db"))
+            try:
+                cache.put(*self.headers[1]._replace(prev_block="1598700"))
+                cache.put(*self.headers[2])
+                self.assertIsNone(cache.get(1598701)[4])
+                self.assertEqual([row[4] for row in cache.get_range(1598701, 1598702)], [None, self.headers[1].hash])
+            finally:
+                cache.close()
+
+    def test_stream_checks_the_links_of_defiscan_headers(self):
+        parsed = [self.parse(header) for header in self.headers]
+        stream = HeaderStream(create_calculator(block_source=FakeBlockSource(parsed)), 4, 2)
+        self.assertEqual([record.height for record in stream.headers(1598700, 1598719)], list(range(1598700, 1598720)))
+        # block 1598710 from another chain
+        parsed[10] = parsed[10]._replace(prev_block=parsed[8].hash)
+        stream = HeaderStream(create_calculator(block_source=FakeBlockSource(parsed)), 4, 2)
+        with self.assertRaises(ValueError):
+            list(stream.headers(1598700, 1598719))
+
+if __name__ == "__main__":
+    unittest.main()
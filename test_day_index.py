@@ -0,0 +1,37 @@
+import os, random, tempfile, unittest
+from datetime import datetime, timedelta
+from dateutil.parser import parse
+from ChainDayIndex import ChainDayIndex
+from DfiTestSupport import brute_force_first_block, out_of_order_chain, run_command, write_chain
+
+class TestIndexDays(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.chain = os.path.join(self.workdir.name, "chain.json")
+        # block times go back and forth around midnight of 2022-02-04
+        self.headers = out_of_order_chain(random.Random(5), datetime(2022, 1, 29), datetime(2022, 2, 4), 8)
+        self.times = [parse(header.timestamp) for header in self.headers]
+        write_chain(self.chain, self.headers)
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def index_days(self, name, *argv):
+        path = os.path.join(self.workdir.name, name)
+        run_command("index-days", "-from", "2022-02-01", "-to", "2022-02-05", "-b", str(self.headers[0].height),
+                    "-bs", "fake", "-fake_chain", self.chain, "-nc", "-di", path, *argv)
+        day_index = ChainDayIndex(path)
+        try:
+            return {date: day_index.get(date) for date in ["2022-02-01", "2022-02-02", "2022-02-03", "2022-02-04", "2022-02-05"]}
+        finally:
+            day_index.close()
+
+    def test_search_and_stream_agree(self):
+        expected = {(datetime(2022, 2, 1) + timedelta(days=i)).strftime("%Y-%m-%d"):
+                    brute_force_first_block(self.headers, self.times, datetime(2022, 2, 1) + timedelta(days=i)) for i in range(5)}
+        self.assertEqual(self.index_days("search.db"), expected)
+        self.assertEqual(self.index_days("stream.db", "-stream", "-stream_batch", "50"), expected)
+
+if __name__ == "__main__":
+    unittest.main()
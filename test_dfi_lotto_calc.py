@@ -0,0 +1,33 @@
+import unittest
+from DfiBlockSource import FakeBlockSource
+from DfiDrawingEngine import DrawingInputs, compute_winning_ticket
+from DfiTestSupport import DRAWING5_ARCHIVE, DRAWING5_CHAIN, DRAWING5_PRICES, PUBLISHED_DRAWINGS, run_calc
+
+class TestPublishedDrawings(unittest.TestCase):
+
+    def test_drawing_math_matches_the_published_results(self):
+        for drawing, (dfi, btc, block, block_hash, minter, tickets, first_concat, sha256_result, winning_ticket) in PUBLISHED_DRAWINGS.items():
+            result = compute_winning_ticket(DrawingInputs(dfi, btc, block, block_hash, minter, tickets))
+            self.assertEqual((result.first_concat, result.sha256_result, result.winning_ticket),
+                             (first_concat, sha256_result, winning_ticket), "drawing " + str(drawing))
+
+    def test_fixture_carries_the_published_drawing_5_inputs(self):
+        # the synthetic chain is only as good as the published values it was built around
+        dfi, btc, block, block_hash, minter, tickets, first_concat, sha256_result, winning_ticket = PUBLISHED_DRAWINGS[5]
+        header = FakeBlockSource.from_file(DRAWING5_CHAIN).get_block(block)
+        self.assertEqual((header.hash[-4:], header.minter[-4:]), (block_hash, minter))
+
+class TestDrawing5(unittest.TestCase):
+
+    def assert_ticket_9(self, run):
+        self.assertEqual(run.returncode, 0, run.stderr)
+        self.assertIn("winning_ticket:  9 ", run.stdout)
+
+    def test_fake_chain_and_fake_prices(self):
+        self.assert_ticket_9(run_calc("-bs", "fake", "-fake_chain", DRAWING5_CHAIN, "-nc", "-ex", "fake", "-fake_prices", DRAWING5_PRICES))
+
+    def test_replay(self):
+        self.assert_ticket_9(run_calc("-bs", "rpc", "-replay", DRAWING5_ARCHIVE))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import json, os, tempfile, unittest
+from DfiBlockSource import FakeBlockSource, parse_block_time
+from DfiTestSupport import DRAWING5_CHAIN, create_calculator, run_command
+from HeaderStream import HeaderStream
+
+class TestHeaderStream(unittest.TestCase):
+
+    def setUp(self):
+        with open(DRAWING5_CHAIN) as f:
+            self.blocks = json.load(f)
+        self.chain = FakeBlockSource.from_file(DRAWING5_CHAIN)
+
+    def stream(self, batch_size, workers, chain=None):
+        return HeaderStream(create_calculator(block_source=chain or self.chain), batch_size, workers)
+
+    def test_headers_in_height_order_up_to_the_tip(self):
+        for batch_size, workers in [(1, 1), (7, 3), (500, 4)]:
+            records = list(self.stream(batch_size, workers).headers(1598700))
+            self.assertEqual([record.height for record in records], [block["height"] for block in self.blocks])
+            self.assertEqual([(record.block_hash(), record.prev_block_hash(), record.minter) for record in records],
+                             [(block["hash"], block["prev_block"], block["minter"]) for block in self.blocks])
+
+    def test_range_and_early_stop(self):
+        records = list(self.stream(7, 3).headers(1598830, 1598840))
+        self.assertEqual([record.height for record in records], list(range(1598830, 1598841)))
+        headers = self.stream(7, 3).headers(1598700)
+        self.assertEqual(next(headers).height, 1598700)
+        headers.close()
+
+    def test_broken_link_stops_the_sync(self):
+        headers = [self.chain.get_block(height) for height in range(1598700, 1598800)]
+        headers[50] = headers[50]._replace(prev_block=headers[10].hash)
+        with self.assertRaises(ValueError):
+            list(self.stream(7, 3, FakeBlockSource(headers)).headers(1598700))
+
+    def test_headers_command(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            out = os.path.join(workdir, "headers.jsonl")
+            run_command("headers", "-from", "1598830", "-to", "1598839", "-f", "jsonl", "-out", out, "-stream_batch", "4",
+                        "-bs", "fake", "-fake_chain", DRAWING5_CHAIN, "-nc")
+            with open(out) as f:
+                rows = [json.loads(line) for line in f]
+        blocks = self.blocks[130:140]
+        self.assertEqual([(row["height"], row["hash"], row["prev_block"]) for row in rows],
+                         [(block["height"], block["hash"], block["prev_block"]) for block in blocks])
+        self.assertEqual([parse_block_time(row["time"]) for row in rows], [parse_block_time(self.chain.get_block(block["height"]).timestamp) for block in blocks])
+
+if __name__ == "__main__":
+    unittest.main()
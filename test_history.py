@@ -0,0 +1,40 @@
+import os, tempfile, unittest
+from DfiTestSupport import PACKAGE_DIR, PUBLISHED_DRAWINGS, run_command
+from DrawingHistory import DrawingHistory
+
+PAST_RESULTS = os.path.join(PACKAGE_DIR, "dfi_lotto_past_results.txt")
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "history.db")
+        # importing twice updates the rows instead of adding more
+        run_command("history", "-import", PAST_RESULTS, "-hs", self.path)
+        run_command("history", "-import", PAST_RESULTS, "-hs", self.path)
+        self.history = DrawingHistory(self.path)
+
+    def tearDown(self):
+        self.history.close()
+        self.workdir.cleanup()
+
+    def test_import_of_the_past_results(self):
+        rows = self.history.find()
+        self.assertEqual([row["drawing"] for row in rows], [5, 4, 3, 2])
+        for row in rows:
+            dfi, btc, block, block_hash, minter, tickets, first_concat, sha256_result, winning_ticket = PUBLISHED_DRAWINGS[row["drawing"]]
+            self.assertEqual((row["dfi_at_midnight"], row["btc_at_midnight"], row["first_block_of_target_date"], row["last_4_digits_of_block_hash"],
+                              row["last_4_digits_of_block_minter"], row["total_number_of_tickets"], row["first_concat"], row["sha256_result"],
+                              row["winning_ticket"], row["source"]),
+                             (dfi, btc, block, block_hash, minter, tickets, first_concat, sha256_result, winning_ticket, "import"))
+
+    def test_queries(self):
+        self.assertEqual([row["drawing"] for row in self.history.find(drawing=4)], [4])
+        self.assertEqual([row["drawing"] for row in self.history.find(target_date="2022-01-22")], [3])
+        self.assertEqual([row["drawing"] for row in self.history.find(date_from="2022-01-16", date_to="2022-01-29")], [4, 3])
+        self.assertEqual([row["drawing"] for row in self.history.find(block=1538481)], [2])
+        self.assertEqual([row["drawing"] for row in self.history.find(winning_ticket=9, date_from="2022-02-01")], [5])
+        self.assertEqual(self.history.find(winning_ticket=9, date_to="2022-02-01"), [])
+
+if __name__ == "__main__":
+    unittest.main()
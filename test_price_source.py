@@ -0,0 +1,64 @@
+import json, os, tempfile, threading, time, unittest
+from DfiTestSupport import DRAWING5_MIDNIGHT, DRAWING5_PRICES, create_calculator
+
+class TestDfiPriceSource(unittest.TestCase):
+
+    def quote(self, *argv):
+        calculator = create_calculator("-fake_prices", DRAWING5_PRICES, *argv)
+        return calculator.prices, calculator.prices.quote("DFI/USDT", DRAWING5_MIDNIGHT)
+
+    def test_primary_takes_the_first_exchange_with_the_candle(self):
+        prices, quote = self.quote("-ex", "fake,fake2")
+        self.assertEqual(quote, (2.793, "fake"))
+        prices, quote = self.quote("-ex", "fakeempty,fakedown,fake3,fake")
+        self.assertEqual(quote, (2.79, "fake3"))
+
+    def test_median(self):
+        prices, quote = self.quote("-ex", "fake,fake2,fake3,fakedown", "-pp", "median")
+        self.assertEqual(quote, (2.793, "median(fake,fake2,fake3)"))
+
+    def test_no_exchange_has_the_candle(self):
+        prices, quote = self.quote("-ex", "fakeempty,fakedown")
+        self.assertIsNone(quote)
+
+    def test_slow_exchange_times_out(self):
+        start = time.time()
+        prices, quote = self.quote("-ex", "fakeslow,fake", "-et", "0.5")
+        self.assertEqual(quote, (2.793, "fake"))
+        self.assertLess(time.time() - start, 5)
+        # and is left out of the next quotes for a while
+        self.assertFalse(prices.is_available("fakeslow"))
+
+    def test_queued_calls_get_their_own_timeout(self):
+        # two quotes at once take turns on one venue, each call is quick enough but both together are not
+        with open(DRAWING5_PRICES) as f:
+            venues = json.load(f)
+        venues["fake"]["delay"] = 0.4
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "prices.json")
+            with open(path, "w") as f:
+                json.dump(venues, f)
+            calculator = create_calculator("-fake_prices", path, "-ex", "fake", "-et", "0.6")
+            quotes = {}
+            threads = [threading.Thread(target=lambda symbol=symbol: quotes.update({symbol: calculator.prices.quote(symbol, DRAWING5_MIDNIGHT)}))
+                       for symbol in ["DFI/USDT", "BTC/USDT"]]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(quotes["DFI/USDT"], (2.793, "fake"))
+        self.assertEqual(quotes["BTC/USDT"].source, "fake")
+        self.assertTrue(calculator.prices.is_available("fake"))
+
+    def test_probing_a_slow_exchange_does_not_hold_up_the_others(self):
+        calculator = create_calculator("-fake_prices", DRAWING5_PRICES, "-ex", "fakeslow,fake", "-et", "1", "-probe")
+        slow = threading.Thread(target=lambda: self.assertRaises(TimeoutError, calculator.get_exchange, "fakeslow"))
+        slow.start()
+        time.sleep(0.1)
+        start = time.time()
+        calculator.get_exchange("fake")
+        self.assertLess(time.time() - start, 0.5)
+        slow.join()
+
+if __name__ == "__main__":
+    unittest.main()
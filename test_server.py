@@ -0,0 +1,51 @@
+import argparse, logging, random, unittest
+from datetime import datetime
+from DfiBlockSource import BlockNotFound, FakeBlockSource
+from DfiLotteryBench import synthetic_chain
+from DfiLotteryServer import DfiLotteryServer
+from DfiTestSupport import create_calculator
+
+class GrowingChain(FakeBlockSource):
+
+    # a fake chain that only serves blocks up to tip, and counts the lookups
+    def __init__(self, headers, tip):
+        super().__init__(headers)
+        self.tip = tip
+        self.lookups = 0
+
+    def get_block(self, block):
+        self.lookups += 1
+        if (int(block) > self.tip):
+            raise BlockNotFound("ERROR: block " + str(block) + " is past the tip of the fake chain")
+        return super().get_block(block)
+
+class TestFollowTip(unittest.TestCase):
+
+    def setUp(self):
+        headers = synthetic_chain(random.Random(5), datetime(2022, 2, 4), 1598000, 2000)
+        self.chain = GrowingChain(headers, 1598000 + 1000)
+        calculator = create_calculator(block_source=self.chain)
+        parser = argparse.ArgumentParser()
+        self.server = DfiLotteryServer(logging.getLogger("test_dfi_lotto_calc"), parser.add_subparsers(), calculator)
+        self.head = calculator.get_block_height_and_time(1598000)
+
+    def follow_tip(self):
+        self.chain.lookups = 0
+        self.head = self.server.follow_tip(self.head)
+        return self.head[0]
+
+    def test_gallops_past_the_tip_and_back(self):
+        # catching up on a thousand blocks takes a logarithmic number of lookups
+        self.assertEqual(self.follow_tip(), 1599000)
+        self.assertLessEqual(self.chain.lookups, 22)
+        # nothing new costs one lookup, one new block two
+        self.assertEqual(self.follow_tip(), 1599000)
+        self.assertEqual(self.chain.lookups, 1)
+        self.chain.tip += 1
+        self.assertEqual(self.follow_tip(), 1599001)
+        self.assertEqual(self.chain.lookups, 3)
+        self.chain.tip += 77
+        self.assertEqual(self.follow_tip(), 1599078)
+
+if __name__ == "__main__":
+    unittest.main()
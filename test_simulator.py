@@ -0,0 +1,42 @@
+import csv, os, random, tempfile, unittest
+from DfiDrawingEngine import DrawingInputs, compute_winning_ticket
+from DfiLotterySimulator import (BASE58_DIGITS, BLOCK_HEIGHT_RANGE, MULTIPLY_DFI_BY_BTC_RANGE, parse_ticket_totals, rounding_share,
+                                 simulate_chunk)
+from DfiTestSupport import run_command
+
+class TestSimulate(unittest.TestCase):
+
+    def test_chunk_matches_the_drawing_engine(self):
+        ticket_totals = [10, 55]
+        counts = simulate_chunk((7, 3, 500, ticket_totals))
+        # the same synthetic drawings, put through calc's engine with the product as the DFI price and a BTC price of 1
+        rng = random.Random("7:3")
+        expected = [[0] * (total_number_of_tickets + 1) for total_number_of_tickets in ticket_totals]
+        for _ in range(500):
+            product, block = rng.randint(*MULTIPLY_DFI_BY_BTC_RANGE), rng.randint(*BLOCK_HEIGHT_RANGE)
+            block_hash, minter = "{:04x}".format(rng.getrandbits(16)), "".join(rng.choices(BASE58_DIGITS, k=4))
+            for total_number_of_tickets, total_counts in zip(ticket_totals, expected):
+                total_counts[compute_winning_ticket(DrawingInputs(product, 1, block, block_hash, minter, total_number_of_tickets)).winning_ticket] += 1
+        self.assertEqual(counts, expected)
+
+    def test_results_do_not_depend_on_jobs(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            frequencies = []
+            for jobs in ["1", "2"]:
+                out = os.path.join(workdir, "fairness" + jobs + ".csv")
+                run_command("simulate", "-n", "3000", "-chunk", "700", "-t", "10,55", "-j", jobs, "-seed", "5", "-out", out)
+                with open(out, newline="") as f:
+                    frequencies.append(list(csv.DictReader(f)))
+        self.assertEqual(frequencies[0], frequencies[1])
+        self.assertEqual(sum(int(row["hits"]) for row in frequencies[0] if row["total_number_of_tickets"] == "55"), 3000)
+
+    def test_ticket_totals_and_rounding_shares(self):
+        self.assertEqual(parse_ticket_totals("10,55"), [10, 55])
+        self.assertEqual(parse_ticket_totals("3:5"), [3, 4, 5])
+        with self.assertRaises(ValueError):
+            parse_ticket_totals("0,10")
+        for total_number_of_tickets in [1, 10, 55]:
+            self.assertAlmostEqual(sum(rounding_share(ticket, total_number_of_tickets) for ticket in range(total_number_of_tickets + 1)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
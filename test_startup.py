@@ -0,0 +1,21 @@
+import os, subprocess, sys, tempfile, unittest
+from DfiLotteryBench import DEFERRED_MODULES
+from DfiTestSupport import DRAWING5_CHAIN, PACKAGE_DIR
+
+class TestDeferredImports(unittest.TestCase):
+
+    def loaded_modules(self, *argv):
+        # the top level modules a fresh dfi_lotto_calc.py run loaded, from -X importtime like the startup bench stage
+        with tempfile.TemporaryDirectory() as workdir:
+            run = subprocess.run([sys.executable, "-X", "importtime", os.path.join(PACKAGE_DIR, "dfi_lotto_calc.py")] + list(argv),
+                                 cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=120)
+        self.assertEqual(run.returncode, 0, run.stderr)
+        return set(line.split("|")[-1].strip().split(".")[0] for line in run.stderr.splitlines() if line.startswith("import time:"))
+
+    def test_help_and_offline_calc_leave_the_network_modules_alone(self):
+        for argv in [["-h"], ["calc", "-d", "2022-02-05", "-b", "1598900", "-t", "60", "-dfi", "2.793", "-btc", "41603.4",
+                              "-bs", "fake", "-fake_chain", DRAWING5_CHAIN, "-nc", "-nh"]]:
+            self.assertEqual([module for module in DEFERRED_MODULES if module in self.loaded_modules(*argv)], [], argv)
+
+if __name__ == "__main__":
+    unittest.main()
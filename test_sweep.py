@@ -0,0 +1,38 @@
+import csv, os, tempfile, unittest
+from collections import Counter
+from itertools import product
+from DfiBlockSource import FakeBlockSource
+from DfiDrawingEngine import DrawingInputs, compute_winning_ticket
+from DfiLotterySweep import import_numpy, parse_range
+from DfiTestSupport import DRAWING5_CHAIN, run_command
+
+class TestSweep(unittest.TestCase):
+
+    def test_parse_range(self):
+        np = import_numpy()
+        self.assertEqual(parse_range(np, "2.780:2.785:0.001").tolist(), [2.78, 2.781, 2.782, 2.783, 2.784, 2.785])
+        self.assertEqual(parse_range(np, "55:58", integer=True).tolist(), [55, 56, 57, 58])
+        self.assertEqual(parse_range(np, "41603.4, 41700").tolist(), [41603.4, 41700.0])
+        with self.assertRaises(ValueError):
+            parse_range(np, "3:2")
+
+    def test_histogram_matches_the_drawing_engine(self):
+        dfi_prices = [2.790, 2.791, 2.792, 2.793, 2.794]
+        btc_prices = [41603.0, 41603.2, 41603.4, 41603.6]
+        ticket_totals = [55, 60, 343]
+        first_blocks = [1598834, 1598835, 1598836]
+        chain = FakeBlockSource.from_file(DRAWING5_CHAIN)
+        expected = Counter()
+        for dfi, btc, tickets, block in product(dfi_prices, btc_prices, ticket_totals, first_blocks):
+            header = chain.get_block(block)
+            expected[(tickets, compute_winning_ticket(DrawingInputs(dfi, btc, block, header.hash, header.minter, tickets)).winning_ticket)] += 1
+        with tempfile.TemporaryDirectory() as workdir:
+            out = os.path.join(workdir, "sweep.csv")
+            run_command("sweep", "-dfi", "2.790:2.794:0.001", "-btc", "41603:41603.6:0.2", "-t", "55,60,343", "-b", "1598834:1598836",
+                        "-bs", "fake", "-fake_chain", DRAWING5_CHAIN, "-nc", "-out", out)
+            with open(out, newline="") as f:
+                histogram = {(int(row["total_number_of_tickets"]), int(row["winning_ticket"])): int(row["combinations"]) for row in csv.DictReader(f)}
+        self.assertEqual(histogram, dict(expected))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json, os, tempfile, unittest
+from DfiTestSupport import DRAWING5_CHAIN, DRAWING5_PRICES, run_calc
+from DfiTracer import DURATION_BUCKETS, NULL_SPAN, DfiTracer, Span
+
+def read_metrics(path):
+    # {metric line without its value: value} of a Prometheus text file
+    with open(path) as f:
+        return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in f if line.strip() and not line.startswith("#")}
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.trace_log = os.path.join(self.workdir.name, "trace.jsonl")
+        self.metrics_file = os.path.join(self.workdir.name, "dfi_lotto_calc.prom")
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def finish(self, tracer, name, duration, **attributes):
+        span = Span(tracer, name, attributes)
+        span.start_time = 0
+        span.duration = duration
+        tracer.finish(span)
+
+    def test_disabled_tracer_hands_out_the_null_span(self):
+        tracer = DfiTracer()
+        self.assertIs(tracer.span("block_lookup", block="1"), NULL_SPAN)
+        tracer.close()
+        self.assertEqual(os.listdir(self.workdir.name), [])
+
+    def test_histogram_is_cumulative(self):
+        tracer = DfiTracer(metrics_file=self.metrics_file)
+        for duration in [0.003, 0.02, 0.7, 40.0]:
+            self.finish(tracer, "block_lookup", duration, cache="miss")
+        self.finish(tracer, "block_lookup", 0.0005, cache="hit")
+        tracer.close()
+        metrics = read_metrics(self.metrics_file)
+        buckets = [metrics['dfi_lotto_span_duration_seconds_bucket{span="block_lookup",le="' + str(bucket) + '"}'] for bucket in DURATION_BUCKETS]
+        self.assertEqual(buckets, [sum(1 for duration in [0.0005, 0.003, 0.02, 0.7, 40.0] if duration <= bucket) for bucket in DURATION_BUCKETS])
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(metrics['dfi_lotto_span_duration_seconds_bucket{span="block_lookup",le="+Inf"}'], 5)
+        self.assertEqual(metrics['dfi_lotto_span_duration_seconds_count{span="block_lookup"}'], 5)
+        self.assertAlmostEqual(metrics['dfi_lotto_span_duration_seconds_sum{span="block_lookup"}'], 40.7235)
+        self.assertEqual(metrics['dfi_lotto_cache_lookups_total{result="miss",span="block_lookup"}'], 4)
+        self.assertEqual(metrics['dfi_lotto_cache_lookups_total{result="hit",span="block_lookup"}'], 1)
+
+    def test_calc_run_traces_the_drawing(self):
+        run = run_calc("-bs", "fake", "-fake_chain", DRAWING5_CHAIN, "-nc", "-ex", "fake", "-fake_prices", DRAWING5_PRICES,
+                       "-trace", self.trace_log, "-metrics", self.metrics_file)
+        self.assertEqual(run.returncode, 0, run.stderr)
+        with open(self.trace_log) as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual(len(set(span["run"] for span in spans)), 1)
+        names = set(span["span"] for span in spans)
+        self.assertTrue({"first_block_search", "price_quote", "drawing"} <= names, names)
+        drawing = next(span for span in spans if span["span"] == "drawing")
+        self.assertEqual((drawing["first_block_of_target_date"], drawing["winning_ticket"]), (1598835, 9))
+        metrics = read_metrics(self.metrics_file)
+        self.assertEqual(metrics['dfi_lotto_span_duration_seconds_count{span="drawing"}'], 1)
+
+if __name__ == "__main__":
+    unittest.main()